@@ -0,0 +1,150 @@
+"""
+Several independent paper accounts, each running its own strategy on shared market data.
+
+Accounts are configured with ACCOUNTS_CONFIG, a JSON file holding a list of
+  {"account_id": "momentum", "initial_balance": 1000, "models": ["..."],
+   "policy": "majority", "system_prompt_file": "prompts/momentum.txt"}
+(every key but account_id is optional; "system_prompt" may be given inline).
+Without it there is a single account, the original account_main.
+
+A cycle gathers market data once and then asks every account's models in parallel,
+so N strategies cost one data fetch and N LLM calls.
+"""
+import os
+import json
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from trading_agent import (
+    PaperTradingAccount, demo_account, get_all_market_data, run_account_cycle,
+    run_sentiment_analysis, ACCOUNT_ID, INITIAL_BALANCE,
+)
+from price_stream import price_stream
+from triggers import TriggerIndex
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+STRATEGY_KEYS = ("models", "policy", "system_prompt")
+
+def load_account_configs(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    path = path or os.getenv("ACCOUNTS_CONFIG")
+    if not path:
+        return [{"account_id": ACCOUNT_ID}]
+    with open(path) as f:
+        configs = json.load(f)
+
+    seen = set()
+    for config in configs:
+        account_id = config.get("account_id")
+        if not account_id or account_id in seen:
+            raise ValueError(f"Every account in {path} needs a unique account_id, got '{account_id}'")
+        seen.add(account_id)
+        prompt_file = config.pop("system_prompt_file", None)
+        if prompt_file:
+            with open(os.path.join(os.path.dirname(path), prompt_file)) as f:
+                config["system_prompt"] = f.read()
+    return configs
+
+class AccountManager:
+    """Hosts the configured accounts; each one keeps its own lock (account.lock)."""
+    def __init__(self):
+        self.accounts: Dict[str, PaperTradingAccount] = {}
+        self.strategies: Dict[str, Dict[str, Any]] = {}
+        # Stop/target levels of every account's positions, keyed (account_id, coin), so a
+        # tick only visits the positions it crosses however many accounts there are
+        self.triggers = TriggerIndex()
+
+    def load(self, configs: Optional[List[Dict[str, Any]]] = None):
+        self.accounts.clear()
+        self.strategies.clear()
+        self.triggers = TriggerIndex()
+        for config in configs or load_account_configs():
+            account_id = config["account_id"]
+            initial_balance = float(config.get("initial_balance", INITIAL_BALANCE))
+            if account_id == ACCOUNT_ID:
+                # The original account keeps its global instance (run_agent_cycle uses it)
+                account = demo_account
+                account.set_initial_balance(initial_balance)
+            else:
+                account = PaperTradingAccount(initial_balance, account_id)
+            account.use_triggers(self.triggers)
+            self.accounts[account_id] = account
+            self.strategies[account_id] = {k: config[k] for k in STRATEGY_KEYS if config.get(k)}
+        logger.info(f"Loaded {len(self.accounts)} accounts: {list(self.accounts)}")
+
+    async def initialize(self):
+        """Load the configured accounts and their state, sharing one DB connection."""
+        if not self.accounts:
+            self.load()
+        db = None
+        for account in self.accounts.values():
+            await account.initialize(db)
+            if db is None:
+                db = account.db
+
+    async def run_sentiment_analysis(self) -> Dict[str, Any]:
+        """Market regime analysis, logged through the accounts' shared DB connection."""
+        if not self.accounts:
+            await self.initialize()
+        return await run_sentiment_analysis(next(iter(self.accounts.values())))
+
+    def get(self, account_id: str) -> PaperTradingAccount:
+        """Raises KeyError for an unknown account."""
+        return self.accounts[account_id]
+
+    @timed("agent_cycle")
+    async def run_cycle(self, on_event: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """One trading cycle for every account on a single market data gather."""
+        if not self.accounts:
+            await self.initialize()
+
+        market_data, current_prices = await get_all_market_data()
+        # Prefer the last traded price from the live stream over the candle mid price
+        current_prices.update(price_stream.fresh_prices())
+
+        def account_events(account_id: str):
+            if on_event is None:
+                return None
+            return lambda event, data: on_event(event, {"account_id": account_id, **data})
+
+        account_ids = list(self.accounts)
+        results = await asyncio.gather(*(
+            run_account_cycle(self.accounts[account_id], market_data, dict(current_prices),
+                              on_event=account_events(account_id), **self.strategies[account_id])
+            for account_id in account_ids
+        ))
+
+        failed = sum(1 for r in results if r.get("status") == "error")
+        status = "success" if not failed else "error" if failed == len(results) else "partial"
+        return {"status": status, "accounts": dict(zip(account_ids, results))}
+
+    async def on_price_tick(self, symbol: str, price: float):
+        """Close the positions, in any account, whose stop/target this price crosses."""
+        if price <= 0:
+            return
+        for (account_id, coin), reason in self.triggers.crossed(symbol, price):
+            account = self.accounts.get(account_id)
+            if account is not None:
+                await account.close_triggered(coin, price, reason)
+
+    async def close(self):
+        for account in self.accounts.values():
+            await account.close()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "account_id": account_id,
+                "total_value": account.total_value,
+                "total_return_pct": account.total_return_pct,
+                "positions": len(account.positions),
+                "models": self.strategies[account_id].get("models"),
+                "policy": self.strategies[account_id].get("policy"),
+            }
+            for account_id, account in self.accounts.items()
+        ]
+
+# Shared manager, initialized with the app
+account_manager = AccountManager()
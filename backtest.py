@@ -0,0 +1,283 @@
+"""
+Offline backtester: replays stored candles bar by bar through a PaperTradingAccount
+with persistence off, so a strategy can be evaluated without Mongo or the network.
+
+Candles are read from a directory of `<SYMBOL>_<timeframe>.json` files, each holding
+either a /candlesticks response or a list of candle dicts (CandleSeries.to_dicts()).
+Each market's indicators are computed once over its whole history with
+calculate_all_indicators (all of them are causal, so the value at a bar only depends
+on earlier bars) and sliced per bar, instead of recomputing a window on every step.
+At every bar close the decision function gets market data shaped like the live agent's:
+
+    decide(market_data, prices, account) -> list of decisions (may be async)
+
+where market_data is {symbol: {timeframe: indicators}}, with the stepped timeframe plus the
+other --context timeframes found in the directory (15m/1h/4h by default, as the live agent
+uses), each cut at the last bar closed by the current one. Decisions use the live agent's
+format ({"coin", "signal", "stop_loss", "profit_target", "leverage"}) and are executed
+at the bar close; stops and targets are checked against each close before deciding.
+
+    python backtest.py DATA_DIR [--timeframe 15m] [--strategy ema_cross] [--output result.json]
+    python backtest.py --synthetic 10 --bars 35040
+    LLM_REPLAY_MODE=replay python backtest.py DATA_DIR --strategy agent
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import inspect
+import logging
+import argparse
+import random
+from datetime import datetime
+from bisect import bisect_right
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from candle_series import CandleSeries
+from candles import parse_candles, RESOLUTION_MAP, RESOLUTION_SECONDS
+from data import DEFAULT_TIMEFRAMES
+from indicators import calculate_all_indicators, INDICATOR_SERIES
+from trading_agent import PaperTradingAccount, INITIAL_BALANCE, build_agent_prompt
+from ensemble import run_ensemble
+from llm import llm_client
+
+logger = logging.getLogger(__name__)
+
+DecisionFn = Callable[[Dict[str, Any], Dict[str, float], PaperTradingAccount],
+                      Union[List[Dict[str, Any]], Awaitable[List[Dict[str, Any]]]]]
+
+def load_candle_store(directory: str, timeframe: str = "15m") -> Dict[str, CandleSeries]:
+    """Load every `<SYMBOL>_<timeframe>.json` file in directory, keyed by symbol."""
+    suffix = f"_{timeframe}.json"
+    store = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(suffix):
+            with open(os.path.join(directory, name)) as f:
+                store[name[:-len(suffix)]] = parse_candles(json.load(f))
+    return store
+
+def save_candles(path: str, candles: CandleSeries):
+    with open(path, "w") as f:
+        json.dump(candles.to_dicts(), f)
+
+def generate_synthetic_candles(bars: int, seconds: int = 900, start_price: float = 100.0,
+                               seed: Optional[int] = None) -> CandleSeries:
+    """Random-walk candles, for exercising the engine when no recorded data is at hand."""
+    rng = random.Random(seed)
+    series = CandleSeries()
+    price = start_price
+    for i in range(bars):
+        open_ = price
+        price = max(price * (1 + rng.gauss(0, 0.004)), 0.01)
+        spread = abs(rng.gauss(0, 0.002)) * price
+        series.append(i * seconds, open_, max(open_, price) + spread, min(open_, price) - spread, price, 0.0)
+    return series
+
+def hold_strategy(market_data, prices, account) -> List[Dict[str, Any]]:
+    return []
+
+def ema_cross_strategy(market_data, prices, account) -> List[Dict[str, Any]]:
+    """
+    Reference strategy: trend-follow EMA20/EMA50 with RSI14 filter,
+    2 ATR stop and 3 ATR target; close when the trend flips against the position.
+    """
+    decisions = []
+    for coin, timeframes in market_data.items():
+        data = next(iter(timeframes.values()))
+        if not data.get("ema50") or not data.get("atr14") or not data.get("rsi14"):
+            continue
+        price = prices[coin]
+        ema20, ema50, rsi, atr = data["ema20"][-1], data["ema50"][-1], data["rsi14"][-1], data["atr14"][-1]
+        position = account.positions.get(coin)
+        if position:
+            if (position["sign"] == "LONG") != (ema20 > ema50):
+                decisions.append({"coin": coin, "signal": "close"})
+        elif atr > 0:
+            if ema20 > ema50 and rsi < 70:
+                decisions.append({"coin": coin, "signal": "buy_to_enter", "leverage": 2,
+                                  "stop_loss": price - 2 * atr, "profit_target": price + 3 * atr})
+            elif ema20 < ema50 and rsi > 30:
+                decisions.append({"coin": coin, "signal": "sell_to_enter", "leverage": 2,
+                                  "stop_loss": price + 2 * atr, "profit_target": price - 3 * atr})
+    return decisions
+
+async def agent_strategy(market_data, prices, account) -> List[Dict[str, Any]]:
+    """
+    The live agent: same prompt and model ensemble as run_agent_cycle.
+    Run with LLM_REPLAY_MODE=record once, then LLM_REPLAY_MODE=replay to rerun offline.
+    """
+    ensemble = await run_ensemble(build_agent_prompt(market_data, account), temperature=0.1)
+    return ensemble["decisions"]
+
+STRATEGIES: Dict[str, DecisionFn] = {
+    "hold": hold_strategy,
+    "ema_cross": ema_cross_strategy,
+    "agent": agent_strategy,
+}
+
+class _IndicatorWindows:
+    """Full-history indicator series for one market, sliced to the last `count` values up to a bar."""
+    def __init__(self, candles: CandleSeries, count: int):
+        self.count = count
+        indicators = calculate_all_indicators(candles, output_count=len(candles))
+        # Each series is aligned to the end: series[j] belongs to bar j + offset
+        self.series = [(name, indicators.get(name, []), len(candles) - len(indicators.get(name, [])))
+                       for name in INDICATOR_SERIES]
+
+    def at(self, bar: int) -> Dict[str, List[float]]:
+        window = {}
+        for name, values, offset in self.series:
+            end = bar - offset + 1
+            window[name] = values[max(end - self.count, 0):end] if end > 0 else []
+        return window
+
+def _timeframe_seconds(timeframe: str) -> int:
+    return RESOLUTION_SECONDS[RESOLUTION_MAP.get(timeframe, timeframe)]
+
+def _close_times(series: CandleSeries, timeframe: str) -> List[int]:
+    """Close time of every bar in seconds (timestamps may be in milliseconds)."""
+    seconds = _timeframe_seconds(timeframe)
+    return [(ts // 1000 if ts > 10**11 else ts) + seconds for ts in series.timestamp]
+
+def _drawdown(equity: List[float]) -> Dict[str, float]:
+    peak = equity[0] if equity else 0.0
+    max_dd = max_dd_pct = 0.0
+    for value in equity:
+        if value > peak:
+            peak = value
+        dd = peak - value
+        if dd > max_dd:
+            max_dd = dd
+        if peak and dd / peak * 100.0 > max_dd_pct:
+            max_dd_pct = dd / peak * 100.0
+    return {"max_drawdown": max_dd, "max_drawdown_pct": max_dd_pct}
+
+async def run_backtest(candles: Dict[str, CandleSeries], decide: DecisionFn, timeframe: str = "15m",
+                       initial_balance: float = INITIAL_BALANCE, warmup: int = 50,
+                       output_count: int = 20,
+                       context: Optional[Dict[str, Dict[str, CandleSeries]]] = None) -> Dict[str, Any]:
+    """
+    Step through all markets in timestamp order. Markets without a bar at a given
+    timestamp keep their last price. Decisions start once every market has `warmup` bars.
+    `context` adds other timeframes to the market data, {timeframe: {symbol: candles}}
+    like the live agent's 1h/4h; each is sliced to the bars closed by the current bar's close.
+    Returns the equity curve, drawdown, trade stats and replay speed.
+    """
+    started = time.perf_counter()
+    # Positions and trades are stamped with the time of the bar being replayed
+    bar_time = [datetime.utcfromtimestamp(0)]
+    account = PaperTradingAccount(initial_balance, account_id="backtest", durability="off",
+                                  clock=lambda: bar_time[0])
+    windows = {symbol: _IndicatorWindows(series, output_count) for symbol, series in candles.items()}
+    step_seconds = _timeframe_seconds(timeframe)
+    # (timeframe, symbol) -> (bar close times, indicator windows) for the context timeframes
+    context_windows = {
+        (tf, symbol): (_close_times(series, tf), _IndicatorWindows(series, output_count))
+        for tf, store in (context or {}).items() if tf != timeframe
+        for symbol, series in store.items() if symbol in candles
+    }
+    positions = {symbol: 0 for symbol in candles}
+    prices: Dict[str, float] = {}
+    is_async = inspect.iscoroutinefunction(decide)
+    timestamps = sorted(set().union(*(series.timestamp for series in candles.values())))
+    equity_curve = []
+    bars = decisions = 0
+
+    for ts in timestamps:
+        # Decisions are made at the bar close
+        bar_time[0] = datetime.utcfromtimestamp((ts // 1000 if ts > 10**11 else ts) + step_seconds)
+        for symbol, series in candles.items():
+            i = positions[symbol]
+            if i < len(series) and series.timestamp[i] == ts:
+                prices[symbol] = series.close[i]
+                positions[symbol] = i + 1
+                bars += 1
+
+        await account.update_positions(prices)
+
+        if min(positions.values()) >= warmup:
+            market_data = {symbol: {timeframe: windows[symbol].at(positions[symbol] - 1)}
+                           for symbol in candles}
+            if context_windows:
+                step_close = (ts // 1000 if ts > 10**11 else ts) + step_seconds
+                for (tf, symbol), (close_times, tf_windows) in context_windows.items():
+                    # Only bars closed by now: the one still forming would leak its future close
+                    market_data[symbol][tf] = tf_windows.at(bisect_right(close_times, step_close) - 1)
+            result = decide(market_data, prices, account)
+            if is_async or inspect.isawaitable(result):
+                result = await result
+            for decision in result or []:
+                coin = decision.get("coin")
+                if coin in prices:
+                    await account.execute_trade(decision, prices[coin])
+                    decisions += 1
+
+        equity_curve.append((ts, account.total_value))
+
+    # Mark open positions to the final prices, without closing them
+    await account.update_positions(prices)
+    elapsed = time.perf_counter() - started
+    equity = [value for _, value in equity_curve]
+    return {
+        "markets": list(candles),
+        "timeframe": timeframe,
+        "context_timeframes": sorted({tf for tf, _ in context_windows}),
+        "steps": len(timestamps),
+        "bars": bars,
+        "decisions": decisions,
+        "initial_balance": initial_balance,
+        "final_value": account.total_value,
+        "total_return_pct": account.total_return_pct,
+        **_drawdown(equity),
+        "trades": account.summary.to_dict(),
+        "open_positions": account.positions,
+        "equity_curve": equity_curve,
+        "elapsed_seconds": elapsed,
+        "bars_per_second": bars / elapsed if elapsed else None,
+        "llm_replay": llm_client.get_replay_stats(),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay stored candles through a strategy.")
+    parser.add_argument("data_dir", nargs="?", help="directory of <SYMBOL>_<timeframe>.json candle files")
+    parser.add_argument("--timeframe", default="15m", help="timeframe the replay steps through")
+    parser.add_argument("--context", default=",".join(DEFAULT_TIMEFRAMES),
+                        help="timeframes given to the strategy, like the live agent's (default: %(default)s)")
+    parser.add_argument("--strategy", default="ema_cross", choices=list(STRATEGIES))
+    parser.add_argument("--balance", type=float, default=INITIAL_BALANCE)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--synthetic", type=int, metavar="MARKETS", help="use random-walk candles for this many markets")
+    parser.add_argument("--bars", type=int, default=35040, help="bars per synthetic market (default: one year of 15m)")
+    parser.add_argument("--output", help="write the full result, including the equity curve, as JSON")
+    args = parser.parse_args()
+
+    context = {}
+    if args.synthetic:
+        store = {f"SYN{i}": generate_synthetic_candles(args.bars, seed=i) for i in range(args.synthetic)}
+    elif args.data_dir:
+        store = load_candle_store(args.data_dir, args.timeframe)
+        for tf in args.context.split(","):
+            tf = tf.strip()
+            if tf and tf != args.timeframe:
+                context[tf] = load_candle_store(args.data_dir, tf)
+                missing = sorted(set(store) - set(context[tf]))
+                if missing:
+                    logger.warning(f"No {tf} candles for {missing}, their market data lacks {tf}")
+    else:
+        parser.error("pass a data directory or --synthetic")
+    if not store:
+        sys.exit(f"No *_{args.timeframe}.json candle files in {args.data_dir}")
+
+    if args.strategy == "agent" and not llm_client.start():
+        sys.exit("The agent strategy needs OPENROUTER_API_KEY or LLM_REPLAY_MODE=replay")
+    # Per-trade account logging (and skipped-entry warnings) would dominate the replay time
+    logging.getLogger("trading_agent").setLevel(logging.ERROR)
+    result = asyncio.run(run_backtest(store, STRATEGIES[args.strategy], args.timeframe,
+                                      args.balance, args.warmup, context=context))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, default=str)
+    summary = {k: v for k, v in result.items() if k not in ("equity_curve", "open_positions")}
+    print(json.dumps(summary, indent=2, default=str))
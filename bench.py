@@ -0,0 +1,357 @@
+"""
+Benchmarks for the hot paths, run on recorded fixtures without network, Mongo or an API key:
+
+  parse_candles[n]        /candlesticks response -> CandleSeries
+  indicators[n]           calculate_all_indicators over n bars
+  prompt_encode[name]     market snapshot -> prompt text, per encoding (prompt_encoding.py)
+  build_agent_prompt      the full agent prompt, account included
+  agent_cycle             run_agent_cycle end to end: candle fetch (served from the fixtures),
+                          indicators, prompt, a streamed fake LLM response and trade execution
+                          with the account persisting to an in-memory Mongo stand-in
+
+Candle fixtures are /candlesticks responses in fixtures/candles/<SYMBOL>_<timeframe>.json
+(the layout backtest.py reads); `--record` refreshes them from mainnet.
+Results are written as JSON and compared to a stored baseline: any benchmark whose median
+is more than `--tolerance` slower than its baseline fails the run (exit status 1).
+Medians are compared relative to a fixed pure-Python loop timed next to each benchmark,
+which absorbs most of the drift in machine speed; baselines are still best recorded on
+the machine that runs the comparison.
+
+    python bench.py                                   # run, compare to fixtures/bench_baseline.json
+    python bench.py --output bench.json --filter indicators
+    python bench.py --save-baseline                   # run and store the result as the baseline
+    python bench.py --record                          # fetch fresh candle fixtures
+"""
+import os
+import sys
+import json
+import time
+import types
+import asyncio
+import inspect
+import logging
+import platform
+import argparse
+import statistics
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+# Everything runs offline: no replay store, no price stream, streamed single-model cycles
+os.environ["LLM_REPLAY_MODE"] = "off"
+os.environ.setdefault("AGENT_MODELS", "bench/fake-model")
+os.environ.setdefault("LLM_STREAM", "true")
+
+import candles
+from candles import parse_candles, clear_candle_cache
+from indicators import calculate_all_indicators
+from data import analysis_flight, DEFAULT_TIMEFRAMES
+from markets import get_market_universe
+from prompt_encoding import ENCODERS, encode_market_data, load_snapshot
+from llm import llm_client
+from triggers import TriggerIndex
+from trading_agent import demo_account, build_agent_prompt, run_agent_cycle
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+CANDLE_FIXTURES_DIR = os.path.join(FIXTURES_DIR, "candles")
+SNAPSHOT_PATH = os.path.join(FIXTURES_DIR, "market_snapshot.json")
+DEFAULT_BASELINE = os.path.join(FIXTURES_DIR, "bench_baseline.json")
+
+# Bars kept per fixture, the longest series length benchmarked must fit in the 15m one
+FIXTURE_BARS = {"15m": 2000, "1h": 500, "4h": 500}
+SERIES_LENGTHS = (100, 500, 2000)
+
+# ----------------------------------------------------------------- fixtures
+
+def load_candle_fixtures(directory: str = CANDLE_FIXTURES_DIR) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """(symbol, timeframe) -> recorded /candlesticks response."""
+    fixtures = {}
+    for name in sorted(os.listdir(directory)):
+        symbol, _, rest = name.partition("_")
+        if rest.endswith(".json"):
+            with open(os.path.join(directory, name)) as f:
+                fixtures[(symbol, rest[:-len(".json")])] = json.load(f)
+    return fixtures
+
+async def record_candle_fixtures(directory: str = CANDLE_FIXTURES_DIR):
+    """Fetch the configured markets' candles from mainnet and store them as fixtures."""
+    os.makedirs(directory, exist_ok=True)
+    now = int(time.time())
+    try:
+        for market_id, symbol in get_market_universe():
+            for timeframe in DEFAULT_TIMEFRAMES:
+                resolution = candles.RESOLUTION_MAP.get(timeframe, timeframe)
+                bars = FIXTURE_BARS[timeframe]
+                seconds = candles.RESOLUTION_SECONDS[resolution]
+                response = await candles.api.get_candles(market_id, resolution, now - bars * seconds, now, bars)
+                path = os.path.join(directory, f"{symbol}_{timeframe}.json")
+                with open(path, "w") as f:
+                    json.dump(response, f, separators=(",", ":"))
+                print(f"{path}: {len(response.get('candlesticks', []))} candles")
+    finally:
+        await candles.close_api()
+
+class FixtureCandleApi:
+    """Stands in for candles.api, answering get_candles from the recorded responses."""
+    def __init__(self, fixtures: Dict[Tuple[str, str], Dict[str, Any]]):
+        self.symbols = dict(get_market_universe())
+        self.fixtures = fixtures
+
+    async def get_candles(self, market_id: int, resolution: str, timestamp_start: int,
+                          timestamp_end: int, count_back: int) -> dict:
+        response = self.fixtures[(self.symbols[market_id], resolution)]
+        return {**response, "candlesticks": response["candlesticks"][-count_back:]}
+
+    async def close_connection(self):
+        pass
+
+class FakeCollection:
+    """The few motor collection calls the account makes, kept in memory."""
+    def __init__(self):
+        self.documents: Dict[Any, Dict[str, Any]] = {}
+        self.inserted = 0
+
+    async def create_index(self, *args, **kwargs):
+        return None
+
+    async def find_one(self, query: Dict[str, Any]):
+        return self.documents.get(query.get("_id"))
+
+    async def replace_one(self, query: Dict[str, Any], document: Dict[str, Any], upsert: bool = False):
+        # Round trip through JSON like the BSON encoding would
+        self.documents[query["_id"]] = json.loads(json.dumps(document))
+
+    async def insert_one(self, document: Dict[str, Any]):
+        json.dumps(document, default=str)
+        self.inserted += 1
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections: Dict[str, FakeCollection] = {}
+
+    def get_collection(self, name: str) -> FakeCollection:
+        return self.collections.setdefault(name, FakeCollection())
+
+class FakeLLM:
+    """
+    Stands in for the AsyncOpenAI client: streams a fixed decision list in small
+    chunks, then a usage chunk, with no network delay.
+    """
+    def __init__(self, decisions: List[Dict[str, Any]], chunk_size: int = 16):
+        self.text = json.dumps(decisions)
+        self.chunk_size = chunk_size
+        self.chat = types.SimpleNamespace(completions=self)
+
+    async def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs):
+        usage = types.SimpleNamespace(prompt_tokens=sum(len(m["content"]) for m in messages) // 4,
+                                      completion_tokens=len(self.text) // 4)
+        if not stream:
+            message = types.SimpleNamespace(content=self.text)
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+        return self._stream(usage)
+
+    async def _stream(self, usage):
+        for i in range(0, len(self.text), self.chunk_size):
+            delta = types.SimpleNamespace(content=self.text[i:i + self.chunk_size])
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)
+        yield types.SimpleNamespace(choices=[], usage=usage)
+
+def _fixture_decisions(fixtures: Dict[Tuple[str, str], Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One long, one short and one hold, with stops around each market's last close."""
+    decisions = []
+    signals = ("buy_to_enter", "sell_to_enter", "hold")
+    for i, (_, symbol) in enumerate(get_market_universe()):
+        close = float(fixtures[(symbol, "15m")]["candlesticks"][-1]["close"])
+        signal = signals[i % len(signals)]
+        direction = -1 if signal == "sell_to_enter" else 1
+        decisions.append({
+            "coin": symbol,
+            "signal": signal,
+            "stop_loss": round(close * (1 - 0.02 * direction), 2),
+            "profit_target": round(close * (1 + 0.04 * direction), 2),
+            "leverage": 2,
+            "confidence": 0.6,
+            "justification": "bench",
+        })
+    return decisions
+
+# ----------------------------------------------------------------- runner
+
+def _reference_workload():
+    total = 0.0
+    for i in range(20000):
+        total += (i % 7) * 0.5
+    return total
+
+def _reference_time(rounds: int = 20) -> float:
+    """Best time of a fixed pure-Python loop, the unit benchmarks are normalized to."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        _reference_workload()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+Benchmark = Tuple[str, Optional[Callable[[], Any]], Callable[[], Union[Any, Awaitable[Any]]]]
+
+async def _measure(setup: Optional[Callable[[], Any]], fn: Callable[[], Any],
+                   min_time: float, min_iterations: int, max_iterations: int) -> Dict[str, Any]:
+    is_async = inspect.iscoroutinefunction(fn)
+    times = []
+    # One untimed call to warm caches and lazy imports
+    for warmup in (True, False):
+        started = time.perf_counter()
+        while True:
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            if is_async:
+                await fn()
+            else:
+                fn()
+            elapsed = time.perf_counter() - start
+            if warmup:
+                break
+            times.append(elapsed)
+            if len(times) >= max_iterations:
+                break
+            if len(times) >= min_iterations and time.perf_counter() - started >= min_time:
+                break
+
+    times.sort()
+    return {
+        "iterations": len(times),
+        "min": times[0],
+        "median": statistics.median(times),
+        "p95": times[min(len(times) - 1, int(0.95 * len(times)))],
+        "mean": statistics.fmean(times),
+    }
+
+def build_benchmarks(fixtures: Dict[Tuple[str, str], Dict[str, Any]]) -> List[Benchmark]:
+    benchmarks: List[Benchmark] = []
+
+    # Candle parsing and indicators on the longest recorded series
+    symbol = next(s for s, tf in fixtures if tf == "15m")
+    response = fixtures[(symbol, "15m")]
+    series = parse_candles(response)
+    for n in SERIES_LENGTHS:
+        if n > len(series):
+            logger.warning(f"Skipping n={n}, the {symbol} 15m fixture only has {len(series)} bars")
+            continue
+        sliced = {**response, "candlesticks": response["candlesticks"][-n:]}
+        window = series[-n:]
+        benchmarks.append((f"parse_candles[{n}]", None, lambda r=sliced: parse_candles(r)))
+        benchmarks.append((f"indicators[{n}]", None,
+                           lambda w=window: calculate_all_indicators(w, output_count=20)))
+
+    # Prompt serialization of the recorded market snapshot
+    market_data = load_snapshot(SNAPSHOT_PATH)
+    for name in ENCODERS:
+        benchmarks.append((f"prompt_encode[{name}]", None, lambda n=name: encode_market_data(market_data, n)))
+    benchmarks.append(("build_agent_prompt", None, lambda: build_agent_prompt(market_data, demo_account)))
+
+    # Full cycle: fixtures instead of the candle API, fake LLM and Mongo
+    def reset_cycle():
+        clear_candle_cache()
+        analysis_flight.clear()
+        demo_account.cash = demo_account.initial_balance
+        demo_account.positions.clear()
+        demo_account.triggers = TriggerIndex()
+
+    benchmarks.append(("agent_cycle", reset_cycle, run_agent_cycle))
+    return benchmarks
+
+async def run_benchmarks(filter_: Optional[str] = None, min_time: float = 0.5, min_iterations: int = 5,
+                         max_iterations: int = 1000) -> Dict[str, Any]:
+    fixtures = load_candle_fixtures()
+    candles.api = FixtureCandleApi(fixtures)
+    llm_client.start(FakeLLM(_fixture_decisions(fixtures)))
+    await demo_account.initialize(FakeDatabase())
+    # A cycle's writes are batched into one save_state; "sync" keeps that write in the timing
+    demo_account.durability = "sync"
+
+    results = {}
+    for name, setup, fn in build_benchmarks(fixtures):
+        if filter_ and filter_ not in name:
+            continue
+        reference = _reference_time()
+        stats = await _measure(setup, fn, min_time, min_iterations, max_iterations)
+        # The machine's speed drifts between runs (frequency scaling, noisy neighbours); measured
+        # right next to each benchmark, the reference loop cancels most of that out
+        stats["reference"] = (reference + _reference_time()) / 2
+        stats["normalized"] = stats["median"] / stats["reference"]
+        results[name] = stats
+
+    return {
+        "created": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": results,
+    }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Print current vs baseline medians; returns the names that regressed beyond tolerance.
+    The change is computed on the medians normalized to the reference loop.
+    """
+    regressions = []
+    base = baseline.get("benchmarks", {})
+    print(f"{'benchmark':28s} {'median ms':>11s} {'baseline ms':>12s} {'change':>8s}")
+    for name, stats in results["benchmarks"].items():
+        current = stats["median"]
+        if name not in base:
+            print(f"{name:28s} {current * 1e3:11.3f} {'-':>12s} {'new':>8s}")
+            continue
+        previous = base[name]["median"]
+        change = stats["normalized"] / base[name]["normalized"] - 1
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:28s} {current * 1e3:11.3f} {previous * 1e3:12.3f} {change * 100:+7.1f}%{flag}")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths on recorded fixtures.")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=float(os.getenv("BENCH_TOLERANCE", 0.5)),
+                        help="allowed slowdown vs the baseline (0.5 = 50%%)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to spend per benchmark")
+    parser.add_argument("--record", action="store_true", help="fetch fresh candle fixtures from mainnet")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    # Trade execution logs every fill
+    logging.getLogger("trading_agent").setLevel(logging.ERROR)
+
+    if args.record:
+        asyncio.run(record_candle_fixtures())
+        return 0
+
+    results = asyncio.run(run_benchmarks(args.filter, args.min_time))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) more than {args.tolerance:.0%} slower than the baseline: "
+              f"{', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,8 @@ import lighter.modules.api
 # Monkeypatch VERSION to v1 because the server endpoint is v1
 lighter.modules.api.VERSION = "/v1"
 
-from lighter.modules.api import Api
+from lighter.modules.api import AsyncApi, BaseApi
+from lighter.helpers.request_helpers import generate_query_path
 from lighter.constants import (
     HOST, 
     BLOCKCHAIN_ARBITRUM_ID,
@@ -11,15 +12,62 @@ from lighter.constants import (
     CANDLESTICK_RESOLUTION_1H,
     CANDLESTICK_RESOLUTION_4H
 )
+import asyncio
+import os
 import time
-from typing import List, Dict, Union, Optional
+import aiohttp
+from candle_series import CandleSeries
+from metrics import timed, UPSTREAM_ERRORS
+from typing import List, Dict, Tuple, Union, Optional
 
-class CustomApi(Api):
+# Max candle requests in flight at once (3 markets x 3 timeframes fit in one round trip)
+DEFAULT_MAX_CONCURRENCY = 10
+
+class CustomAsyncApi(AsyncApi):
     """
-    Subclass of Api to fix get_candles method which uses incorrect parameter name in SDK.
-    Server expects 'market_id', SDK sends 'order_book_symbol'.
+    Async subclass of the SDK Api so candle fetches don't block the event loop.
+    Fixes get_candles parameter name: server expects 'market_id', SDK sends 'order_book_symbol'.
+    The aiohttp session is pooled and created lazily inside the running loop,
+    and in-flight requests are bounded by CANDLE_MAX_CONCURRENCY.
     """
-    def get_candles(self, market_id: int, resolution: str, timestamp_start: int, timestamp_end: int, count_back: int) -> dict:
+    def __init__(self, host: str, blockchain_id: int, api_auth: str, api_timeout: Optional[int]):
+        # Skip AsyncApi.__init__, it opens a session outside of any event loop
+        BaseApi.__init__(self, host, blockchain_id, api_auth, api_timeout)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+
+    def _init_session(self) -> aiohttp.ClientSession:
+        max_concurrency = int(os.getenv("CANDLE_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.api_timeout),
+            headers={
+                "Accept": "application/json",
+                "User-Agent": "lighter/python",
+                "Auth": self.api_auth,
+            },
+        )
+
+    async def _get(self, request_path: str, params: dict = {}, to_public_api: Optional[bool] = True) -> dict:
+        if self.session is None or self.session.closed:
+            self.session = self._init_session()
+
+        version = lighter.modules.api.VERSION
+        host = self.host + "/api" + version if to_public_api else self.host + version
+        url = generate_query_path(host + request_path, params)
+
+        async with self.semaphore:
+            async with self.session.get(url) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    async def close_connection(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def get_candles(self, market_id: int, resolution: str, timestamp_start: int, timestamp_end: int, count_back: int) -> dict:
         params = {
             "blockchain_id": self.blockchain_id,
             "market_id": market_id,
@@ -28,105 +76,179 @@ class CustomApi(Api):
             "end_timestamp": timestamp_end,
             "count_back": count_back
         }
-        return self._get(request_path="/candlesticks", params=params)
+        return await self._get(request_path="/candlesticks", params=params)
 
-# Initialize the CustomAPI
+    async def get_order_books(self) -> dict:
+        """Market metadata for every order book (symbol, market_id, decimals)."""
+        return await self._get(request_path="/orderBooks")
+
+# Initialize the CustomAsyncApi
 # Using the URL from user's example
 API_URL = "https://mainnet.zklighter.elliot.ai"
-api = CustomApi(host=API_URL, blockchain_id=BLOCKCHAIN_ARBITRUM_ID, api_auth="", api_timeout=10)
+api = CustomAsyncApi(host=API_URL, blockchain_id=BLOCKCHAIN_ARBITRUM_ID, api_auth="", api_timeout=10)
+
+async def close_api():
+    """Close the pooled candle HTTP session (call on app shutdown)."""
+    await api.close_connection()
+
+# Map duration input to SDK constants
+RESOLUTION_MAP = {
+    "1m": "1m",
+    "5m": "5m",
+    "1hr": "1h",
+    "1h": "1h",
+    "4hr": "4h",
+    "4h": "4h",
+    # fallback if user passes constants directly or other formats
+    "1min": "1m",
+    "5min": "5m",
+    "15m": "15m", 
+    "1d": "1d",
+}
+
+# Bar length in seconds per resolution, used for the fetch window and cache expiry
+RESOLUTION_SECONDS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "1h": 3600,
+    "4h": 14400,
+    "1d": 86400
+}
+
+# In-process candle buffers: (market_id, resolution) -> {"candles", "limit", "expires_at"}
+# Each buffer is a bounded rolling window of history (the largest limit requested, never
+# more than CANDLE_BUFFER_SIZE bars); once the current bar
+# closes it is refreshed by fetching only the bars newer than the last stored timestamp.
+CANDLE_BUFFER_SIZE = int(os.getenv("CANDLE_BUFFER_SIZE", 1000))
+
+_candle_cache: Dict[Tuple[int, str], Dict] = {}
+cache_stats = {"hits": 0, "misses": 0, "tail_refreshes": 0}
+
+def get_cache_stats() -> Dict[str, int]:
+    """Return candle cache hit/miss counters and number of cached series."""
+    return {**cache_stats, "entries": len(_candle_cache)}
 
-def get_candles(market_id: int, duration: str, limit: int = 100) -> List[Dict]:
+def clear_candle_cache():
+    _candle_cache.clear()
+    for k in cache_stats:
+        cache_stats[k] = 0
+
+def _to_seconds(timestamp: int) -> int:
+    # Candle timestamps may come back in milliseconds
+    return timestamp // 1000 if timestamp > 10**11 else timestamp
+
+@timed("get_candles")
+async def get_candles(market_id: int, duration: str, limit: int = 100) -> CandleSeries:
     """
     Fetch candlestick data for a given market and duration using Lighter Python SDK.
+    Served from the in-process buffer until the current bar closes; requests with a
+    smaller limit reuse the longer series already stored for the same market/resolution.
+    After a bar close only the new bars are requested and merged into the buffer.
     
     Args:
         market_id (int): The ID of the market (e.g. 1 for WETH-USDC).
         duration (str): Resolution string, e.g., "1m", "5m", "1h", "4h".
-        limit (int): Number of candles to retrieve.
+        limit (int): Number of candles to retrieve, at most CANDLE_BUFFER_SIZE.
         
     Returns:
-        List[Dict]: List of candlestick data dictionaries.
+        CandleSeries: Columnar candle data, oldest to newest.
     """
+    resolution = RESOLUTION_MAP.get(duration, duration)
+    seconds = RESOLUTION_SECONDS.get(resolution, 3600)
+    # Bounds both the request and the buffer kept afterwards
+    limit = min(limit, CANDLE_BUFFER_SIZE)
     
-    # Map duration input to SDK constants
-    resolution_map = {
-        "1m": "1m",
-        "5m": "5m",
-        "1hr": "1h",
-        "1h": "1h",
-        "4hr": "4h",
-        "4h": "4h",
-        # fallback if user passes constants directly or other formats
-        "1min": "1m",
-        "5min": "5m",
-        "15m": "15m", 
-        "1d": "1d",
-    }
+    now = int(time.time())
+    key = (market_id, resolution)
+    entry = _candle_cache.get(key)
+    expires_at = (now // seconds + 1) * seconds
     
-    resolution = resolution_map.get(duration, duration)
+    if entry and entry["limit"] >= limit:
+        if now < entry["expires_at"]:
+            cache_stats["hits"] += 1
+            return entry["candles"][-limit:]
+        
+        # Tail refresh: only ask for bars from the last stored one (still forming) onwards
+        last_ts = _to_seconds(entry["candles"].timestamp[-1])
+        count_back = (now - last_ts) // seconds + 1
+        if count_back < entry["limit"]:
+            new_candles = await _fetch_candles(market_id, resolution, last_ts, now, count_back)
+            if new_candles:
+                cache_stats["tail_refreshes"] += 1
+                entry["candles"].merge_tail(new_candles, entry["limit"])
+                entry["expires_at"] = expires_at
+                return entry["candles"][-limit:]
     
-    # Map duration to seconds for start time calculation
-    seconds_map = {
-        "1m": 60, "1m": 60,
-        "5m": 300, "5m": 300,
-        "15m": 900, "15m": 900,
-        "1h": 3600, "1hr": 3600,
-        "4h": 14400, "4hr": 14400,
-        "1d": 86400
-    }
+    cache_stats["misses"] += 1
     
-    seconds = seconds_map.get(duration, 3600)
+    # Refetch as much history as already cached (up to CANDLE_BUFFER_SIZE) so other callers'
+    # longer series survive, but never less than this request asked for: the buffer is
+    # cached at the requested size, and a larger limit is served from it afterwards
+    fetch_limit = max(limit, min(entry["limit"], CANDLE_BUFFER_SIZE)) if entry else limit
+    candles = await _fetch_candles(market_id, resolution, now - (fetch_limit * seconds), now, fetch_limit)
     
-    now = int(time.time())
-    start_time = now - (limit * seconds)
+    if candles:
+        _candle_cache[key] = {
+            "candles": candles,
+            "limit": fetch_limit,
+            "expires_at": expires_at,
+        }
     
+    return candles[-limit:]
+
+async def _fetch_candles(market_id: int, resolution: str, start_time: int, end_time: int, limit: int) -> CandleSeries:
     try:
-        response = api.get_candles(
+        response = await api.get_candles(
             market_id=market_id,
             timestamp_start=start_time,
-            timestamp_end=now,
+            timestamp_end=end_time,
             resolution=resolution,
             count_back=limit
         )
-        
-        # Parse response
-        items = response.get('candlesticks', []) if isinstance(response, dict) else response
-        
-        formatted_candles = []
-        for c in items:
-            if isinstance(c, dict):
-                formatted_candles.append({
-                    "timestamp": c.get("timestamp"),
-                    "open": float(c.get("open", 0)),
-                    "high": float(c.get("high", 0)),
-                    "low": float(c.get("low", 0)),
-                    "close": float(c.get("close", 0)),
-                })
-            else:
-                formatted_candles.append({
-                    "timestamp": getattr(c, "timestamp", 0),
-                    "open": float(getattr(c, "open", 0)),
-                    "high": float(getattr(c, "high", 0)),
-                    "low": float(getattr(c, "low", 0)),
-                    "close": float(getattr(c, "close", 0)),
-                })
-                
-        formatted_candles.sort(key=lambda x: x['timestamp'])
-        return formatted_candles[-limit:]
+        return parse_candles(response)[-limit:]
         
     except Exception as e:
+        UPSTREAM_ERRORS.inc(upstream="candles")
         print(f"Error fetching candles: {e}")
-        return []
+        return CandleSeries()
+
+def parse_candles(response: Union[dict, list]) -> CandleSeries:
+    """Parse a /candlesticks response into a CandleSeries sorted by timestamp."""
+    items = response.get('candlesticks', []) if isinstance(response, dict) else response
+    
+    rows = []
+    for c in items:
+        get = c.get if isinstance(c, dict) else (lambda key, default, c=c: getattr(c, key, default))
+        rows.append((
+            int(get("timestamp", 0) or 0),
+            float(get("open", 0)),
+            float(get("high", 0)),
+            float(get("low", 0)),
+            float(get("close", 0)),
+            float(get("volume", 0) or 0),
+        ))
+    rows.sort(key=lambda x: x[0])
+    
+    if not rows:
+        return CandleSeries()
+    return CandleSeries(*zip(*rows))
 
 if __name__ == "__main__":
     # Test script with mapping ID 1 (common for WETH-USDC in examples)
     # The user should provide the correct ID, but 1 is a good guess for mainnet WETH-USDC
-    try:
+    async def _main():
         m_id = 1
         print(f"Fetching candles for Market ID {m_id}...")
-        candles = get_candles(m_id, "5m", 5)
-        print(f"Got {len(candles)} candles.")
-        if candles:
-            print(candles)
+        try:
+            candles = await get_candles(m_id, "5m", 5)
+            print(f"Got {len(candles)} candles.")
+            if candles:
+                print(candles.to_dicts())
+        finally:
+            await close_api()
+
+    try:
+        asyncio.run(_main())
     except Exception as e:
         print(f"Test failed: {e}")
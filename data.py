@@ -1,6 +1,46 @@
+import asyncio
+import os
 import time
+from typing import Dict, List, Optional, Tuple
 from candles import get_candles
-from indicators import calculate_all_indicators
+from candle_series import CandleSeries
+from indicators import calculate_all_indicators, IndicatorEngine
+from markets import get_market_universe, get_symbol
+from singleflight import SingleFlight
+from metrics import STAGE_SECONDS
+
+DEFAULT_TIMEFRAMES = ["15m", "1h", "4h"]
+# Markets analyzed at once by get_batch_analysis (each runs one fetch per timeframe)
+DEFAULT_ANALYSIS_CONCURRENCY = 4
+
+# Identical concurrent analysis requests share one fetch + compute; results are
+# reused for ANALYSIS_REUSE_SECONDS (default 2s) to absorb fan-out from many UI tabs.
+analysis_flight = SingleFlight(ttl=float(os.getenv("ANALYSIS_REUSE_SECONDS", 2.0)))
+
+# Streaming indicator state per (market_id, duration), advanced with each new candle
+_engines: Dict[Tuple[int, str], IndicatorEngine] = {}
+ENGINE_HISTORY = 100
+
+def _update_engine(market_id: int, duration: str, candles: CandleSeries, limit: int) -> IndicatorEngine:
+    """
+    Feed new/revised candles into the stored engine, or seed a fresh one
+    if there is none yet, the candles no longer overlap its last bar, or
+    it holds fewer than `limit` values of some series.
+    """
+    key = (market_id, duration)
+    engine = _engines.get(key)
+    timestamps = candles.timestamp
+    if (engine is None or engine.last_timestamp < timestamps[0]
+            or engine.last_timestamp > timestamps[-1]
+            or min(len(values) for values in engine.series.values()) < limit):
+        engine = IndicatorEngine.from_candles(candles, history=ENGINE_HISTORY)
+        _engines[key] = engine
+        return engine
+
+    for i in range(len(candles)):
+        if timestamps[i] >= engine.last_timestamp:
+            engine.update(candles[i])
+    return engine
 
 async def get_indicators(duration: str, market_id: int, limit: int = 20):
     """
@@ -8,49 +48,78 @@ async def get_indicators(duration: str, market_id: int, limit: int = 20):
     duration: "5m", "1h", "4h"
     limit: Number of records to return (default 20)
     Returns dictionary with midPrices, ema20, ema50, rsi7, rsi14, atr14, macd.
+    Concurrent identical requests are coalesced into one run.
     """
-    
+    return await analysis_flight.do(
+        ("indicators", market_id, duration, limit),
+        lambda: _compute_indicators(duration, market_id, limit),
+    )
+
+async def _compute_indicators(duration: str, market_id: int, limit: int):
     # We need enough data for the longest indicator (EMA50) + output limit.
     # Buffer of 100 is safe for calculation warm-up.
-    fetch_limit = limit + 100
+    use_engine = limit <= ENGINE_HISTORY
+    # The engine is shared by every limit, so it is always seeded with its full history
+    fetch_limit = (ENGINE_HISTORY if use_engine else limit) + 100
     
-    candles = get_candles(market_id, duration, limit=fetch_limit)
+    candles = await get_candles(market_id, duration, limit=fetch_limit)
     
-    return calculate_all_indicators(candles, output_count=limit)
+    with STAGE_SECONDS.time(stage="indicators"):
+        if not candles or not use_engine:
+            return calculate_all_indicators(candles, output_count=limit)
+        
+        return _update_engine(market_id, duration, candles, limit).get_indicators(output_count=limit)
 
-async def get_full_analysis(market_id: int):
+async def get_full_analysis(market_id: int, timeframes: List[str] = DEFAULT_TIMEFRAMES):
     """
-    Get 20 candles/indicators for 5m, 1h, and 4h timeframes.
+    Get 20 candles/indicators for 15m, 1h, and 4h timeframes.
     Returns structured data with symbol and indicators.
+    Concurrent identical requests are coalesced into one run.
     """
+    return await analysis_flight.do(
+        ("analysis", market_id, tuple(timeframes)),
+        lambda: _compute_full_analysis(market_id, timeframes),
+    )
+
+async def _compute_full_analysis(market_id: int, timeframes: List[str]):
     # Fetch indicators for all timeframes
     # 20 records requested by user
     limit = 20
     
-    # We could use asyncio.gather for parallelism
-    import asyncio
+    results = await asyncio.gather(*[get_indicators(tf, market_id, limit) for tf in timeframes])
     
-    task_15m = get_indicators("15m", market_id, limit)
-    task_1h = get_indicators("1h", market_id, limit)
-    task_4h = get_indicators("4h", market_id, limit)
+    return {
+        "symbol": get_symbol(market_id),
+        "indicator_data": dict(zip(timeframes, results))
+    }
+
+async def get_batch_analysis(market_ids: Optional[List[int]] = None, timeframes: Optional[List[str]] = None):
+    """
+    Run get_full_analysis for many markets with bounded concurrency.
+    Defaults to the configured market universe and 15m/1h/4h.
+    Failures are reported per market instead of failing the whole batch.
+    """
+    if not market_ids:
+        market_ids = [mid for mid, _ in get_market_universe()]
+    timeframes = timeframes or DEFAULT_TIMEFRAMES
     
-    data_15m, data_1h, data_4h = await asyncio.gather(task_15m, task_1h, task_4h)
+    semaphore = asyncio.Semaphore(int(os.getenv("ANALYSIS_MAX_CONCURRENCY", DEFAULT_ANALYSIS_CONCURRENCY)))
     
-    # TODO: Fetch real symbol from SDK or map ID
-    # For now, defaulting or using a placeholder until we add lookup
-    symbol = "Unknown"
-    if market_id == 1:
-        symbol = "BTC"
-    elif market_id == 2:
-        symbol = "SOL"
-    elif market_id == 0:
-        symbol = "ETH"
+    async def analyze(market_id: int):
+        async with semaphore:
+            analysis = await get_full_analysis(market_id, timeframes)
+        if not any(analysis["indicator_data"].values()):
+            raise ValueError("No candle data returned")
+        return analysis
     
-    return {
-        "symbol": symbol,
-        "indicator_data": {
-            "15m": data_15m,
-            "1h": data_1h,
-            "4h": data_4h
-        }
-    }
+    outcomes = await asyncio.gather(*[analyze(mid) for mid in market_ids], return_exceptions=True)
+    
+    results = []
+    errors = []
+    for market_id, outcome in zip(market_ids, outcomes):
+        if isinstance(outcome, Exception):
+            errors.append({"market_id": market_id, "symbol": get_symbol(market_id), "error": str(outcome)})
+        else:
+            results.append({"market_id": market_id, **outcome})
+    
+    return {"results": results, "errors": errors}
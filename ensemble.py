@@ -0,0 +1,201 @@
+"""
+Multi-model decision ensemble.
+Every cycle queries the configured models concurrently with a hard deadline;
+models that miss it are cancelled and dropped. Their answers are combined by a
+policy from POLICIES:
+
+  first_valid  first model (by arrival) whose answer parses
+  primary      the first configured model, falling back to the first valid other answer
+  majority     per coin, the signal most models agree on (ties go to the earlier model)
+
+Configured from env: AGENT_MODELS (comma separated), AGENT_ENSEMBLE_POLICY and
+AGENT_DEADLINE_SECONDS.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from json_stream import parse_decisions
+from llm import llm_client
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODELS = "google/gemini-2.5-flash-lite"
+DEFAULT_DEADLINE = 45.0
+
+def get_agent_models() -> List[str]:
+    return [m.strip() for m in os.getenv("AGENT_MODELS", DEFAULT_MODELS).split(",") if m.strip()]
+
+def get_agent_deadline() -> float:
+    """Seconds a cycle waits for the models, streamed single-model cycles included."""
+    return float(os.getenv("AGENT_DEADLINE_SECONDS", DEFAULT_DEADLINE))
+
+# Policies take the answers received so far (arrival order), the configured models and
+# whether every model has answered or been dropped. They return the combined decisions,
+# or None while they still need to wait for more answers.
+Answer = Dict[str, Any]
+
+def first_valid(answers: List[Answer], models: List[str], final: bool) -> Optional[List[Dict[str, Any]]]:
+    for answer in answers:
+        if answer["decisions"] is not None:
+            return answer["decisions"]
+    return [] if final else None
+
+def primary(answers: List[Answer], models: List[str], final: bool) -> Optional[List[Dict[str, Any]]]:
+    by_model = {a["model"]: a for a in answers}
+    main = by_model.get(models[0])
+    if main is not None and main["decisions"] is not None:
+        return main["decisions"]
+    if main is None and not final:
+        return None
+    # Primary failed or missed the deadline
+    return first_valid([a for a in answers if a["model"] != models[0]], models, final)
+
+def majority(answers: List[Answer], models: List[str], final: bool) -> Optional[List[Dict[str, Any]]]:
+    if not final:
+        return None
+    valid = sorted((a for a in answers if a["decisions"] is not None), key=lambda a: models.index(a["model"]))
+    votes: Dict[str, Counter] = {}
+    for answer in valid:
+        for decision in answer["decisions"]:
+            votes.setdefault(decision.get("coin"), Counter())[decision.get("signal")] += 1
+
+    combined = []
+    for coin, counter in votes.items():
+        top = max(counter.values())
+        # Ties go to the earliest configured model that voted for one of the top signals
+        for answer in valid:
+            decision = next((d for d in answer["decisions"] if d.get("coin") == coin), None)
+            if decision is not None and counter[decision.get("signal")] == top:
+                combined.append(decision)
+                break
+    return combined
+
+POLICIES: Dict[str, Callable[[List[Answer], List[str], bool], Optional[List[Dict[str, Any]]]]] = {
+    "first_valid": first_valid,
+    "primary": primary,
+    "majority": majority,
+}
+
+class EnsembleStats:
+    """
+    Per-model outcome counters on top of llm_client's latency stats: how often a model
+    answered validly, missed the deadline, was cancelled once the policy had decided,
+    and how often its signals agreed with the combined decision.
+    """
+    def __init__(self):
+        self.models: Dict[str, Dict[str, int]] = {}
+        self.cycles = 0
+
+    def _model(self, model: str) -> Dict[str, int]:
+        return self.models.setdefault(model, {
+            "valid": 0, "invalid": 0, "errors": 0, "timeouts": 0, "cancelled": 0,
+            "agreed": 0, "compared": 0,
+        })
+
+    def record(self, answers: List[Answer], dropped: Dict[str, str], combined: List[Dict[str, Any]]):
+        self.cycles += 1
+        final_signals = {d.get("coin"): d.get("signal") for d in combined}
+        for answer in answers:
+            stats = self._model(answer["model"])
+            if answer["decisions"] is None:
+                stats["errors" if answer["error_type"] == "error" else "invalid"] += 1
+                continue
+            stats["valid"] += 1
+            for decision in answer["decisions"]:
+                coin = decision.get("coin")
+                if coin in final_signals:
+                    stats["compared"] += 1
+                    stats["agreed"] += decision.get("signal") == final_signals[coin]
+        for model, reason in dropped.items():
+            self._model(model)[reason] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        llm_stats = llm_client.get_stats()
+        models = {}
+        for model, stats in self.models.items():
+            answered = stats["valid"] + stats["invalid"] + stats["errors"]
+            attempts = answered + stats["timeouts"]
+            models[model] = {
+                **stats,
+                "failure_rate": (attempts - stats["valid"]) / attempts if attempts else None,
+                "agreement": stats["agreed"] / stats["compared"] if stats["compared"] else None,
+                "latency": llm_stats.get(model),
+            }
+        return {"cycles": self.cycles, "models": models}
+
+ensemble_stats = EnsembleStats()
+
+async def _ask(model: str, messages: List[Dict[str, str]], **kwargs) -> Answer:
+    start = time.perf_counter()
+    answer = {"model": model, "decisions": None, "error": None, "error_type": None}
+    try:
+        completion = await llm_client.chat(model=model, messages=messages, **kwargs)
+        with STAGE_SECONDS.time(stage="parse"):
+            answer["decisions"] = parse_decisions(completion.choices[0].message.content)
+    except ValueError as e:
+        # json.JSONDecodeError is a ValueError too
+        answer["error"], answer["error_type"] = str(e), "invalid"
+    except Exception as e:
+        answer["error"], answer["error_type"] = str(e), "error"
+    answer["latency"] = time.perf_counter() - start
+    return answer
+
+async def run_ensemble(messages: List[Dict[str, str]], models: Optional[List[str]] = None,
+                       policy: Optional[str] = None, deadline: Optional[float] = None,
+                       **kwargs) -> Dict[str, Any]:
+    """
+    Query all models concurrently and combine their decisions.
+    Returns {"decisions": [...], "policy", "answers": {model: {...}}, "dropped": {model: reason}}.
+    """
+    models = models or get_agent_models()
+    policy = policy or os.getenv("AGENT_ENSEMBLE_POLICY", "first_valid")
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown ensemble policy '{policy}', expected one of {list(POLICIES)}")
+    combine = POLICIES[policy]
+    if deadline is None:
+        deadline = get_agent_deadline()
+
+    tasks = {asyncio.create_task(_ask(model, messages, **kwargs)): model for model in models}
+    pending = set(tasks)
+    answers: List[Answer] = []
+    decisions = None
+    end = time.monotonic() + deadline
+    try:
+        while pending and decisions is None:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            # Keep arrival order; ties within one wakeup follow configuration order
+            for task in sorted(done, key=lambda t: models.index(tasks[t])):
+                answers.append(task.result())
+            if pending:
+                decisions = combine(answers, models, False)
+    finally:
+        for task in pending:
+            task.cancel()
+
+    dropped = {}
+    for task in pending:
+        # Still pending after a decision means the policy no longer needed it
+        dropped[tasks[task]] = "cancelled" if decisions is not None else "timeouts"
+    if dropped:
+        logger.info(f"Ensemble dropped {dropped}")
+    if decisions is None:
+        decisions = combine(answers, models, True)
+
+    ensemble_stats.record(answers, dropped, decisions)
+    return {
+        "decisions": decisions,
+        "policy": policy,
+        "answers": {
+            a["model"]: {"latency": a["latency"], "valid": a["decisions"] is not None, "error": a["error"]}
+            for a in answers
+        },
+        "dropped": dropped,
+    }
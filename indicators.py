@@ -1,5 +1,27 @@
 from typing import List, Dict, Union, Optional
+from collections import deque
 import math
+import os
+from candle_series import CandleSeries, as_series
+
+# Batch backend for calculate_all_indicators: "python" (default) or "numpy".
+# Resolved lazily so INDICATOR_BACKEND from .env is picked up.
+INDICATOR_BACKENDS = ("python", "numpy")
+_backend: Optional[str] = None
+
+def set_indicator_backend(name: str):
+    """Select the batch indicator backend at runtime."""
+    global _backend
+    if name not in INDICATOR_BACKENDS:
+        raise ValueError(f"Unknown indicator backend '{name}', expected one of {INDICATOR_BACKENDS}")
+    if name == "numpy":
+        import indicators_numpy  # noqa: F401 - fail early if numpy is missing
+    _backend = name
+
+def get_indicator_backend() -> str:
+    if _backend is None:
+        set_indicator_backend(os.getenv("INDICATOR_BACKEND", "python"))
+    return _backend
 
 def calculate_ema(prices: List[float], period: int) -> List[float]:
     """
@@ -112,7 +134,7 @@ def calculate_macd(prices: List[float]) -> List[float]:
             
     return macd
 
-def calculate_atr(candlesticks: List[Dict], period: int) -> List[float]:
+def calculate_atr(candlesticks: Union[CandleSeries, List[Dict]], period: int) -> List[float]:
     """
     Calculate Average True Range (ATR).
     """
@@ -121,18 +143,19 @@ def calculate_atr(candlesticks: List[Dict], period: int) -> List[float]:
     
     if not candlesticks:
         return atr
+    
+    candlesticks = as_series(candlesticks)
+    highs, lows, closes = candlesticks.high, candlesticks.low, candlesticks.close
         
-    for i in range(len(candlesticks)):
-        current = candlesticks[i]
-        
+    for i in range(len(highs)):
         if i == 0:
-            true_ranges.append(current['high'] - current['low'])
+            true_ranges.append(highs[i] - lows[i])
         else:
-            previous = candlesticks[i-1]
+            previous_close = closes[i-1]
             tr = max(
-                current['high'] - current['low'],
-                abs(current['high'] - previous['close']),
-                abs(current['low'] - previous['close'])
+                highs[i] - lows[i],
+                abs(highs[i] - previous_close),
+                abs(lows[i] - previous_close)
             )
             true_ranges.append(tr)
             
@@ -150,7 +173,7 @@ def calculate_atr(candlesticks: List[Dict], period: int) -> List[float]:
         
     return atr
 
-def calculate_all_indicators(candlesticks: List[Dict], output_count: int = 20) -> Dict:
+def calculate_all_indicators(candlesticks: Union[CandleSeries, List[Dict]], output_count: int = 20) -> Dict:
     """
     Calculate comprehensive set of indicators:
     MidPrices, EMA20, EMA50, RSI7, RSI14, ATR14, MACD.
@@ -160,8 +183,20 @@ def calculate_all_indicators(candlesticks: List[Dict], output_count: int = 20) -
     if not candlesticks:
         return {}
 
-    mid_prices = [round((c['open'] + c['close']) / 2, 3) for c in candlesticks]
-    close_prices = [float(c['close']) for c in candlesticks]
+    candlesticks = as_series(candlesticks)
+
+    if get_indicator_backend() == "numpy":
+        from indicators_numpy import calculate_all_indicators_np
+        return calculate_all_indicators_np(
+            candlesticks.open,
+            candlesticks.high,
+            candlesticks.low,
+            candlesticks.close,
+            output_count=output_count,
+        )
+
+    mid_prices = [round((o + c) / 2, 3) for o, c in zip(candlesticks.open, candlesticks.close)]
+    close_prices = candlesticks.close.tolist()
     
     # Calculate all raw indicators
     ema20 = calculate_ema(close_prices, 20)
@@ -218,3 +253,193 @@ def calculate_all_indicators(candlesticks: List[Dict], output_count: int = 20) -
         "atr14": get_last_n(atr14, output_count),
         "macd": get_last_n(macd, output_count),
     }
+
+
+class _StreamingIndicator:
+    """
+    Base for O(1) per-bar indicator updaters.
+    Keeps a checkpoint of the state before the last bar so the still-forming
+    bar can be revised without recomputing from history.
+    """
+    def update(self, *args, replace_last: bool = False) -> Optional[float]:
+        if replace_last and self._checkpoint is not None:
+            self.__dict__.update(self._checkpoint)
+        self._checkpoint = {
+            k: (v[:] if isinstance(v, list) else v)
+            for k, v in self.__dict__.items() if k != "_checkpoint"
+        }
+        return self._step(*args)
+
+    def _step(self, *args) -> Optional[float]:
+        raise NotImplementedError
+
+
+class StreamingEMA(_StreamingIndicator):
+    """EMA seeded with the SMA of the first `period` prices, same as calculate_ema."""
+    def __init__(self, period: int):
+        self.period = period
+        self.multiplier = 2 / (period + 1)
+        self.seed: List[float] = []
+        self.value: Optional[float] = None
+        self._checkpoint = None
+
+    def _step(self, price: float) -> Optional[float]:
+        if self.value is None:
+            self.seed.append(price)
+            if len(self.seed) < self.period:
+                return None
+            self.value = sum(self.seed) / len(self.seed)
+            self.seed = []
+            return self.value
+        self.value = (price - self.value) * self.multiplier + self.value
+        return self.value
+
+
+class StreamingRSI(_StreamingIndicator):
+    """Wilder-smoothed RSI, same as calculate_rsi."""
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_price: Optional[float] = None
+        self.gains: List[float] = []
+        self.losses: List[float] = []
+        self.avg_gain: Optional[float] = None
+        self.avg_loss: Optional[float] = None
+        self._checkpoint = None
+
+    def _step(self, price: float) -> Optional[float]:
+        if self.prev_price is None:
+            self.prev_price = price
+            return None
+
+        change = price - self.prev_price
+        self.prev_price = price
+        gain = change if change > 0 else 0.0
+        loss = abs(change) if change < 0 else 0.0
+
+        if self.avg_gain is None:
+            self.gains.append(gain)
+            self.losses.append(loss)
+            if len(self.gains) < self.period:
+                return None
+            self.avg_gain = sum(self.gains) / self.period
+            self.avg_loss = sum(self.losses) / self.period
+            self.gains = []
+            self.losses = []
+        else:
+            self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+
+        if self.avg_loss == 0:
+            return 100.0
+        rs = self.avg_gain / self.avg_loss
+        return 100.0 - (100.0 / (1.0 + rs))
+
+
+class StreamingATR(_StreamingIndicator):
+    """Wilder-smoothed ATR, same as calculate_atr."""
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close: Optional[float] = None
+        self.true_ranges: List[float] = []
+        self.value: Optional[float] = None
+        self._checkpoint = None
+
+    def _step(self, high: float, low: float, close: float) -> Optional[float]:
+        if self.prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+
+        if self.value is None:
+            self.true_ranges.append(tr)
+            if len(self.true_ranges) < self.period:
+                return None
+            self.value = sum(self.true_ranges) / self.period
+            self.true_ranges = []
+            return self.value
+        self.value = (self.value * (self.period - 1) + tr) / self.period
+        return self.value
+
+
+class StreamingMACD(_StreamingIndicator):
+    """EMA12 - EMA26 on closes, same as calculate_macd."""
+    def __init__(self):
+        self.ema12 = StreamingEMA(12)
+        self.ema26 = StreamingEMA(26)
+        self._checkpoint = None
+
+    def update(self, price: float, replace_last: bool = False) -> Optional[float]:
+        # The inner EMAs keep their own checkpoints
+        fast = self.ema12.update(price, replace_last=replace_last)
+        slow = self.ema26.update(price, replace_last=replace_last)
+        if fast is None or slow is None:
+            return None
+        return fast - slow
+
+
+INDICATOR_SERIES = ["midPrices", "ema20", "ema50", "rsi7", "rsi14", "atr14", "macd"]
+
+
+class IndicatorEngine:
+    """
+    Stateful indicator set for one (market, resolution), seeded once from history
+    and then advanced one candle at a time instead of recomputing from the first candle.
+    Feeding a candle with the same timestamp as the last one revises the still-forming bar.
+    get_indicators() returns the same shape as calculate_all_indicators.
+    """
+    def __init__(self, history: int = 100):
+        self.history = history
+        self.ema20 = StreamingEMA(20)
+        self.ema50 = StreamingEMA(50)
+        self.rsi7 = StreamingRSI(7)
+        self.rsi14 = StreamingRSI(14)
+        self.atr14 = StreamingATR(14)
+        self.macd = StreamingMACD()
+        self.series: Dict[str, deque] = {name: deque(maxlen=history) for name in INDICATOR_SERIES}
+        self.last_timestamp = None
+        self._last_appended: List[str] = []
+
+    @classmethod
+    def from_candles(cls, candlesticks: Union[CandleSeries, List[Dict]], history: int = 100) -> "IndicatorEngine":
+        engine = cls(history)
+        for c in candlesticks:
+            engine.update(c)
+        return engine
+
+    def update(self, candle: Dict):
+        """Advance by one candle, or revise the last one if the timestamp is unchanged."""
+        timestamp = candle['timestamp']
+        replace = self.last_timestamp is not None and timestamp == self.last_timestamp
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            raise ValueError(f"Candle {timestamp} is older than last candle {self.last_timestamp}")
+
+        if replace:
+            for name in self._last_appended:
+                self.series[name].pop()
+
+        close = float(candle['close'])
+        values = {
+            "midPrices": round((candle['open'] + candle['close']) / 2, 3),
+            "ema20": self.ema20.update(close, replace_last=replace),
+            "ema50": self.ema50.update(close, replace_last=replace),
+            "rsi7": self.rsi7.update(close, replace_last=replace),
+            "rsi14": self.rsi14.update(close, replace_last=replace),
+            "atr14": self.atr14.update(candle['high'], candle['low'], candle['close'], replace_last=replace),
+            "macd": self.macd.update(close, replace_last=replace),
+        }
+
+        self._last_appended = []
+        for name, value in values.items():
+            if value is not None:
+                self.series[name].append(value)
+                self._last_appended.append(name)
+        self.last_timestamp = timestamp
+
+    def get_indicators(self, output_count: int = 20) -> Dict:
+        if self.last_timestamp is None:
+            return {}
+        return {
+            name: [round(x, 2) for x in list(values)[-output_count:]]
+            for name, values in self.series.items()
+        }
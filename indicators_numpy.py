@@ -0,0 +1,120 @@
+"""
+NumPy backend for indicators.calculate_all_indicators.
+Works on columnar OHLC arrays: true range, gains and losses are vectorized and the
+recursive EMA/Wilder smoothing runs through scipy.signal.lfilter when scipy is installed.
+Select it with INDICATOR_BACKEND=numpy or indicators.set_indicator_backend("numpy").
+"""
+from typing import Dict, List, Sequence
+import numpy as np
+
+try:
+    from scipy.signal import lfilter
+except ImportError:
+    lfilter = None
+
+
+def _smooth(values: np.ndarray, alpha: float, seed: float) -> np.ndarray:
+    """
+    First-order recursive filter y[n] = y[n-1] + alpha * (x[n] - y[n-1]), starting from seed.
+    Returns seed followed by one output per input value.
+    """
+    if len(values) == 0:
+        return np.array([seed])
+
+    if lfilter is not None:
+        out, _ = lfilter([alpha], [1.0, alpha - 1.0], values, zi=[(1.0 - alpha) * seed])
+        return np.concatenate(([seed], out))
+
+    out = np.empty(len(values) + 1)
+    out[0] = last = seed
+    for i, x in enumerate(values.tolist(), 1):
+        last = (x - last) * alpha + last
+        out[i] = last
+    return out
+
+
+def _seed(values: np.ndarray, period: int) -> float:
+    # Plain left-to-right sum, same as the pure-Python seed
+    return sum(values[:period].tolist()) / period
+
+
+def ema(prices: np.ndarray, period: int) -> np.ndarray:
+    if len(prices) < period or period <= 0:
+        return np.empty(0)
+    return _smooth(prices[period:], 2 / (period + 1), _seed(prices, period))
+
+
+def rsi(prices: np.ndarray, period: int = 14) -> np.ndarray:
+    if len(prices) < 2:
+        return np.empty(0)
+
+    change = np.diff(prices)
+    gains = np.where(change > 0, change, 0.0)
+    losses = np.where(change < 0, -change, 0.0)
+
+    if len(gains) < period:
+        return np.empty(0)
+
+    avg_gain = _smooth(gains[period:], 1 / period, _seed(gains, period))
+    avg_loss = _smooth(losses[period:], 1 / period, _seed(losses, period))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = 100.0 - (100.0 / (1.0 + avg_gain / avg_loss))
+    return np.where(avg_loss == 0, 100.0, values)
+
+
+def atr(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, period: int) -> np.ndarray:
+    if len(highs) == 0:
+        return np.empty(0)
+
+    true_ranges = highs - lows
+    if len(highs) > 1:
+        prev_close = closes[:-1]
+        true_ranges[1:] = np.maximum.reduce([
+            true_ranges[1:],
+            np.abs(highs[1:] - prev_close),
+            np.abs(lows[1:] - prev_close),
+        ])
+
+    if len(true_ranges) < period:
+        return np.empty(0)
+    return _smooth(true_ranges[period:], 1 / period, _seed(true_ranges, period))
+
+
+def macd(prices: np.ndarray) -> np.ndarray:
+    ema12 = ema(prices, 12)
+    ema26 = ema(prices, 26)
+    offset = 26 - 12
+    length = min(len(ema12) - offset, len(ema26))
+    if length <= 0:
+        return np.empty(0)
+    return ema12[offset:offset + length] - ema26[:length]
+
+
+def calculate_all_indicators_np(opens: Sequence[float], highs: Sequence[float], lows: Sequence[float],
+                                closes: Sequence[float], output_count: int = 20) -> Dict[str, List[float]]:
+    """
+    Same output as indicators.calculate_all_indicators, computed from OHLC columns.
+    """
+    closes = np.asarray(closes, dtype=float)
+    if len(closes) == 0:
+        return {}
+    opens = np.asarray(opens, dtype=float)
+    highs = np.asarray(highs, dtype=float)
+    lows = np.asarray(lows, dtype=float)
+
+    def get_last_n(arr: np.ndarray, n: int) -> List[float]:
+        # Round with Python's round() so results match the pure-Python backend exactly
+        return [round(x, 2) for x in arr[-n:].tolist()]
+
+    mid_prices = [round((o + c) / 2, 3) for o, c in zip(opens[-output_count:].tolist(), closes[-output_count:].tolist())]
+
+    return {
+        "midPrices": [round(x, 2) for x in mid_prices],
+        "ema20": get_last_n(ema(closes, 20), output_count),
+        "ema50": get_last_n(ema(closes, 50), output_count),
+        "rsi7": get_last_n(rsi(closes, 7), output_count),
+        "rsi14": get_last_n(rsi(closes, 14), output_count),
+        "atr14": get_last_n(atr(highs, lows, closes, 14), output_count),
+        "macd": get_last_n(macd(closes), output_count),
+    }
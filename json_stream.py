@@ -0,0 +1,92 @@
+import json
+from typing import Any, Dict, List, Optional
+
+class JsonArrayStreamParser:
+    """
+    Incremental parser for a streamed JSON array of objects (`[{...}, {...}]`).
+    feed() takes raw text chunks and returns every top-level object completed so far,
+    so each decision can be acted on before the rest of the response has arrived.
+    Text before the first '[' or '{' (e.g. a ```json fence) is ignored, and a bare
+    top-level object is treated as a one-element array.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        # Depth at which the objects we emit start: 1 inside an array, 0 for a bare object
+        self.item_depth: Optional[int] = None
+        self.item_start: Optional[int] = None
+        self.in_string = False
+        self.escape = False
+        self.count = 0
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self.buffer += chunk
+        items = []
+        buf = self.buffer
+        for i in range(self.pos, len(buf)):
+            c = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                continue
+
+            if self.item_depth is None:
+                if c == "[":
+                    self.item_depth = 1
+                    self.depth = 1
+                elif c == "{":
+                    self.item_depth = 0
+                    self.depth = 1
+                    self.item_start = i
+                continue
+
+            if c == '"':
+                self.in_string = True
+            elif c in "{[":
+                if self.depth == self.item_depth and c == "{":
+                    self.item_start = i
+                self.depth += 1
+            elif c in "}]":
+                self.depth -= 1
+                if self.depth == self.item_depth and self.item_start is not None:
+                    items.append(json.loads(buf[self.item_start:i + 1]))
+                    self.item_start = None
+                    self.count += 1
+
+        self.pos = len(buf)
+        # Drop text that can no longer be part of a pending object
+        if self.item_start is None:
+            self.buffer = ""
+            self.pos = 0
+        elif self.item_start > 0:
+            self.buffer = buf[self.item_start:]
+            self.pos -= self.item_start
+            self.item_start = 0
+        return items
+
+    @property
+    def complete(self) -> bool:
+        return self.item_depth is not None and self.depth == 0
+
+def parse_decisions(content: str) -> List[Dict[str, Any]]:
+    """
+    Parse a complete (non-streamed) response into a list of decisions.
+    Handles a ```json fenced block and a bare object; raises ValueError on anything else.
+    """
+    clean_content = content.strip()
+    if clean_content.startswith("```json"):
+        clean_content = clean_content[7:]
+    if clean_content.endswith("```"):
+        clean_content = clean_content[:-3]
+
+    decision_data = json.loads(clean_content)
+    if isinstance(decision_data, dict):
+        decision_data = [decision_data]
+    if not isinstance(decision_data, list) or not all(isinstance(d, dict) for d in decision_data):
+        raise ValueError("Unknown decision format")
+    return decision_data
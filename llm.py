@@ -0,0 +1,219 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from llm_replay import ResponseStore
+from metrics import LLM_SECONDS, LLM_TOKENS, UPSTREAM_ERRORS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+
+# Errors worth retrying; anything else (bad request, auth) fails immediately
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+class ModelStats:
+    """Latency and failure counters for one model."""
+    def __init__(self, window: int = 200):
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.latencies: deque = deque(maxlen=window)
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def pct(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "avg_latency": sum(latencies) / len(latencies) if latencies else None,
+            "p50_latency": pct(0.50),
+            "p95_latency": pct(0.95),
+        }
+
+def _count_tokens(model: str, usage: Any):
+    if usage is not None:
+        LLM_TOKENS.inc(usage.prompt_tokens or 0, model=model, kind="prompt")
+        LLM_TOKENS.inc(usage.completion_tokens or 0, model=model, kind="completion")
+
+class LLMClient:
+    """
+    One AsyncOpenAI client shared by every agent cycle, so the HTTP connection
+    pool and TLS sessions survive between calls. Created in main.startup_event
+    and closed on shutdown.
+
+    Configured from env: LLM_BASE_URL (point it at a local fake server in tests),
+    OPENROUTER_API_KEY, LLM_MAX_CONNECTIONS, LLM_TIMEOUT, LLM_CONNECT_TIMEOUT,
+    LLM_MAX_RETRIES and LLM_BACKOFF_SECONDS.
+    LLM_REPLAY_MODE=record saves every response, LLM_REPLAY_MODE=replay serves them
+    back without network access or an API key (see llm_replay.py).
+    """
+    def __init__(self):
+        self.client: Optional[AsyncOpenAI] = None
+        self.max_retries = 2
+        self.backoff = 0.5
+        self.stats: Dict[str, ModelStats] = {}
+        self.replay: Optional[ResponseStore] = None
+        self._replay_configured = False
+
+    def start(self, client: Optional[AsyncOpenAI] = None) -> bool:
+        """Create the shared client (or install the given one). Returns False if no API key is set."""
+        if not self._replay_configured:
+            self.replay = ResponseStore.from_env()
+            self._replay_configured = True
+        if client is not None:
+            self.client = client
+            return True
+        if self.client is not None or (self.replay is not None and self.replay.replaying):
+            return True
+
+        api_key = os.getenv("OPENROUTER_API_KEY")
+        if not api_key:
+            logger.error("OPENROUTER_API_KEY not found in env")
+            return False
+
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", 2))
+        self.backoff = float(os.getenv("LLM_BACKOFF_SECONDS", 0.5))
+        max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+        timeout = float(os.getenv("LLM_TIMEOUT", 60))
+
+        self.client = AsyncOpenAI(
+            base_url=os.getenv("LLM_BASE_URL", DEFAULT_BASE_URL),
+            api_key=api_key,
+            # Retries are handled in chat() so the policy is ours to tune
+            max_retries=0,
+            timeout=httpx.Timeout(timeout, connect=float(os.getenv("LLM_CONNECT_TIMEOUT", 10))),
+            http_client=openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            ),
+        )
+        return True
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+        if self.replay is not None:
+            self.replay.close()
+            self.replay = None
+            self._replay_configured = False
+
+    async def chat(self, model: str, messages: List[Dict[str, str]], **kwargs) -> Any:
+        """
+        chat.completions.create with retry + exponential backoff (with jitter)
+        on connection errors, timeouts, rate limits and 5xx responses.
+        """
+        if self.client is None and not self.start():
+            raise RuntimeError("Missing API Key")
+        if self.replay is not None and self.replay.replaying:
+            return self.replay.completion(model, messages, kwargs)
+
+        stats = self.stats.setdefault(model, ModelStats())
+        stats.calls += 1
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                completion = await self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+                stats.latencies.append(time.perf_counter() - start)
+                LLM_SECONDS.observe(stats.latencies[-1], model=model)
+                _count_tokens(model, getattr(completion, "usage", None))
+                if self.replay is not None:
+                    self.replay.record(model, messages, kwargs, completion.choices[0].message.content)
+                return completion
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    stats.failures += 1
+                    UPSTREAM_ERRORS.inc(upstream="llm")
+                    raise
+                attempt += 1
+                stats.retries += 1
+                delay = self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                logger.warning(f"LLM call to {model} failed ({e.__class__.__name__}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except Exception:
+                stats.failures += 1
+                UPSTREAM_ERRORS.inc(upstream="llm")
+                raise
+
+    async def stream_chat(self, model: str, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """
+        Streaming chat: yields content deltas as they arrive.
+        Retries like chat(), but only until the first chunk; once content has been
+        yielded a failure is raised to the caller. Latency is recorded to the last chunk.
+        """
+        if self.client is None and not self.start():
+            raise RuntimeError("Missing API Key")
+        if self.replay is not None and self.replay.replaying:
+            yield self.replay.lookup(model, messages, kwargs)
+            return
+
+        stats = self.stats.setdefault(model, ModelStats())
+        stats.calls += 1
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            received = False
+            content = []
+            try:
+                stream = await self.client.chat.completions.create(
+                    model=model, messages=messages, stream=True,
+                    # Token usage arrives in a final chunk without choices
+                    stream_options={"include_usage": True}, **kwargs
+                )
+                async for chunk in stream:
+                    _count_tokens(model, getattr(chunk, "usage", None))
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        received = True
+                        content.append(delta)
+                        yield delta
+                stats.latencies.append(time.perf_counter() - start)
+                LLM_SECONDS.observe(stats.latencies[-1], model=model)
+                if self.replay is not None:
+                    self.replay.record(model, messages, kwargs, "".join(content))
+                return
+            except RETRYABLE_ERRORS as e:
+                if received or attempt >= self.max_retries:
+                    stats.failures += 1
+                    UPSTREAM_ERRORS.inc(upstream="llm")
+                    raise
+                attempt += 1
+                stats.retries += 1
+                delay = self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                logger.warning(f"LLM stream to {model} failed ({e.__class__.__name__}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except Exception:
+                stats.failures += 1
+                UPSTREAM_ERRORS.inc(upstream="llm")
+                raise
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {model: stats.to_dict() for model, stats in self.stats.items()}
+
+    def get_replay_stats(self) -> Optional[Dict[str, Any]]:
+        return self.replay.get_stats() if self.replay is not None else None
+
+# Shared client, started/closed with the app
+llm_client = LLMClient()
@@ -0,0 +1,97 @@
+"""
+Record / replay store for LLM responses, keyed on a hash of model + messages + params.
+
+  record  every live response is saved to the store
+  replay  responses are served from the store with no network access; a prompt
+          that was never recorded raises ReplayMiss and is listed in stats["missed"]
+
+Set LLM_REPLAY_MODE (off, record or replay) and LLM_REPLAY_PATH (SQLite file,
+default .cache/llm_replay.sqlite). Recordings made with streaming replay fine
+without it and vice versa: only the response text is stored.
+"""
+import os
+import json
+import hashlib
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+
+REPLAY_MODES = ("off", "record", "replay")
+DEFAULT_REPLAY_PATH = os.path.join(".cache", "llm_replay.sqlite")
+# Missed keys kept for reporting
+MAX_REPORTED_MISSES = 100
+
+class ReplayMiss(LookupError):
+    """Replay mode got a prompt that has no recorded response."""
+
+def prompt_hash(model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class ResponseStore:
+    def __init__(self, path: str = DEFAULT_REPLAY_PATH, mode: str = "replay"):
+        if mode not in REPLAY_MODES or mode == "off":
+            raise ValueError(f"Unknown replay mode '{mode}', expected record or replay")
+        self.path = path
+        self.mode = mode
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, messages TEXT, content TEXT, recorded_at TEXT)"
+        )
+        self.db.commit()
+        self.stats: Dict[str, Any] = {"hits": 0, "misses": 0, "recorded": 0, "missed": []}
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseStore"]:
+        mode = os.getenv("LLM_REPLAY_MODE", "off")
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"Unknown LLM_REPLAY_MODE '{mode}', expected one of {REPLAY_MODES}")
+        if mode == "off":
+            return None
+        return cls(os.getenv("LLM_REPLAY_PATH", DEFAULT_REPLAY_PATH), mode)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def lookup(self, model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+        """Recorded response text, or ReplayMiss."""
+        key = prompt_hash(model, messages, params)
+        row = self.db.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.stats["misses"] += 1
+            if len(self.stats["missed"]) < MAX_REPORTED_MISSES:
+                self.stats["missed"].append({"key": key, "model": model})
+            raise ReplayMiss(f"No recorded response for {model} prompt {key[:12]}")
+        self.stats["hits"] += 1
+        return row[0]
+
+    def completion(self, model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> ChatCompletion:
+        """The recorded response in the shape chat.completions.create returns."""
+        content = self.lookup(model, messages, params)
+        return ChatCompletion(
+            id="replay", object="chat.completion", created=0, model=model,
+            choices=[Choice(index=0, finish_reason="stop",
+                            message=ChatCompletionMessage(role="assistant", content=content))],
+        )
+
+    def record(self, model: str, messages: List[Dict[str, str]], params: Dict[str, Any], content: Optional[str]):
+        key = prompt_hash(model, messages, params)
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (key, model, json.dumps(messages), content or "", datetime.utcnow().isoformat()),
+        )
+        self.db.commit()
+        self.stats["recorded"] += 1
+
+    def close(self):
+        self.db.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        count = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"mode": self.mode, "path": self.path, "stored": count, **self.stats}
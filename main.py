@@ -1,14 +1,68 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-import os
-from data import get_indicators, get_full_analysis
-from trading_agent import run_agent_cycle, demo_account, run_sentiment_analysis
 
+# Load .env before importing modules that read config at import time
 load_dotenv()
 
+import os
+import json
+from typing import List, Optional
+from data import get_indicators, get_full_analysis, get_batch_analysis, analysis_flight
+from candles import close_api, get_cache_stats
+from markets import market_registry, get_market_universe
+from trading_agent import ACCOUNT_ID
+from accounts import account_manager
+from scheduler import CycleScheduler
+from llm import llm_client
+from ensemble import ensemble_stats
+from price_stream import price_stream, feed_from_env
+import metrics
+
 app = FastAPI()
 
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+# Background cycles aligned to 15m bar closes; the POST endpoints enqueue a run on these.
+# Overlap policy is "skip" (drop triggers while a cycle runs) or "queue" (run once more after it).
+agent_scheduler = CycleScheduler(
+    "agent",
+    # Every configured account trades on one shared data gather (see accounts.py).
+    # Decisions are published as they execute, for POST /trade_decision?stream=true
+    lambda: account_manager.run_cycle(on_event=agent_scheduler.publish),
+    interval=int(os.getenv("AGENT_CYCLE_INTERVAL", 900)),
+    jitter=float(os.getenv("AGENT_CYCLE_JITTER", 5)),
+    overlap=os.getenv("AGENT_CYCLE_OVERLAP", "skip"),
+)
+sentiment_scheduler = CycleScheduler(
+    "sentiment",
+    # Logged through the accounts' shared DB connection
+    account_manager.run_sentiment_analysis,
+    interval=int(os.getenv("SENTIMENT_CYCLE_INTERVAL", 900)),
+    jitter=float(os.getenv("AGENT_CYCLE_JITTER", 5)),
+    overlap=os.getenv("AGENT_CYCLE_OVERLAP", "skip"),
+)
+
+@metrics.register_collector
+def _collect_app_stats():
+    """Counters that the caches, scheduler and price stream already keep, read at scrape time."""
+    cache = get_cache_stats()
+    yield ("candle_cache_requests_total", "counter", "Candle cache lookups by result.",
+           [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"]),
+            ({"result": "tail_refresh"}, cache["tail_refreshes"])])
+    yield ("candle_cache_entries", "gauge", "Cached candle series.", [({}, cache["entries"])])
+    # "calls" is the sum of the other outcomes, so it is left out to keep sum() correct
+    yield ("analysis_requests_total", "counter", "Analysis requests by how they were served.",
+           [({"result": k}, v) for k, v in analysis_flight.stats.items() if k != "calls"])
+    yield ("scheduler_cycles_total", "counter", "Scheduled cycles by outcome.",
+           [({"scheduler": s.name, "result": result}, count)
+            for s in (agent_scheduler, sentiment_scheduler)
+            for result, count in (("run", s.runs), ("skipped", s.skipped), ("failed", s.failures))])
+    yield ("price_stream_ticks_total", "counter", "Trade ticks received from the price stream.",
+           [({}, price_stream.stats["ticks"])])
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -19,41 +73,155 @@ app.add_middleware(
 
 @app.on_event("startup")
 async def startup_event():
-    await demo_account.initialize()
+    await market_registry.initialize()
+    market_registry.start_background_refresh()
+    await account_manager.initialize()
+    llm_client.start()
+    # Trade ticks check stops/targets as they happen, between agent cycles
+    price_stream.add_handler(account_manager.on_price_tick)
+    if _env_flag("PRICE_STREAM_ENABLED", "true"):
+        price_stream.start(feed_from_env(get_market_universe()))
+    if _env_flag("AGENT_SCHEDULE_ENABLED", "true"):
+        agent_scheduler.start()
+    if _env_flag("SENTIMENT_SCHEDULE_ENABLED", "false"):
+        sentiment_scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await agent_scheduler.stop()
+    await sentiment_scheduler.stop()
+    await price_stream.stop()
+    await account_manager.close()
+    await llm_client.close()
+    await market_registry.stop()
+    await close_api()
 
 @app.get("/indicators")
-async def indicators(market_id: int, timeframe: str, limit: int = 20):
+async def indicators(market_id: int, timeframe: str, limit: int = Query(20, ge=1, le=500)):
     return await get_indicators(timeframe, market_id, limit)
 
 @app.get("/analysis")
 async def analysis(market_id: int):
     return await get_full_analysis(market_id)
 
+@app.get("/analysis/batch")
+async def batch_analysis(market_ids: Optional[List[int]] = Query(None), timeframes: Optional[List[str]] = Query(None)):
+    """
+    Analyze several markets at once, e.g. /analysis/batch?market_ids=0&market_ids=1&timeframes=1h.
+    Defaults to the configured market universe. Per-market failures are returned under "errors".
+    """
+    return await get_batch_analysis(market_ids, timeframes)
+
+async def _stream_cycle_events(queue):
+    """Server-sent events from a scheduler subscription, ending with the "done" event."""
+    try:
+        while True:
+            event, data = await queue.get()
+            yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+            if event == "done":
+                break
+    finally:
+        agent_scheduler.unsubscribe(queue)
+
 @app.post("/trade_decision")
-async def trade_decision():
+async def trade_decision(wait: bool = False, stream: bool = False):
     """
-    Trigger the AI Agent to analyze markets and make a decision.
+    Enqueue an AI Agent cycle to analyze markets and make a decision.
+    Returns immediately unless wait=true; the outcome is available from GET /trade_decision.
+    With stream=true, responds with server-sent events: one "decision" event per
+    executed decision as the model produces it, then "done" with the cycle result.
     """
-    result = await run_agent_cycle()
-    return result
+    if stream:
+        queue = agent_scheduler.subscribe()
+        # If a cycle is already running, this streams the rest of that one
+        agent_scheduler.trigger()
+        return StreamingResponse(_stream_cycle_events(queue), media_type="text/event-stream")
+    status = agent_scheduler.trigger()
+    if wait:
+        return await agent_scheduler.wait()
+    return {"status": status, "scheduler": agent_scheduler.status()}
+
+@app.get("/trade_decision")
+def last_trade_decision():
+    return {"result": agent_scheduler.last_result, "scheduler": agent_scheduler.status()}
 
 @app.post("/sentiment")
-async def sentiment_analysis():
+async def sentiment_analysis(wait: bool = False):
     """
-    Trigger the AI Agent to analyze market regime.
+    Enqueue an AI Agent market regime analysis.
+    Returns immediately unless wait=true; the outcome is available from GET /sentiment.
     """
-    result = await run_sentiment_analysis()
-    return result
+    status = sentiment_scheduler.trigger()
+    if wait:
+        return await sentiment_scheduler.wait()
+    return {"status": status, "scheduler": sentiment_scheduler.status()}
+
+@app.get("/sentiment")
+def last_sentiment_analysis():
+    return {"result": sentiment_scheduler.last_result, "scheduler": sentiment_scheduler.status()}
+
+def _get_account(account_id: str):
+    try:
+        return account_manager.get(account_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown account '{account_id}'")
+
+@app.get("/accounts")
+def list_accounts():
+    return account_manager.summary()
 
 @app.get("/account")
-def get_account_info():
+def get_account_info(account_id: str = ACCOUNT_ID):
+    account = _get_account(account_id)
+    # history holds only the most recent events, use /account/history to page through the rest
     return {
-        "cash": demo_account.cash,
-        "positions": demo_account.positions,
-        "history": demo_account.history,
-        "total_value": demo_account.total_value
+        "account_id": account.account_id,
+        "cash": account.cash,
+        "positions": account.positions,
+        "history": account.history,
+        "total_value": account.total_value
     }
 
+@app.get("/account/history")
+async def get_account_history(account_id: str = ACCOUNT_ID, coin: Optional[str] = None, action: Optional[str] = None,
+                              start: Optional[str] = None, end: Optional[str] = None,
+                              cursor: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
+    """
+    Trade history, newest first. Filter by coin, action and ISO time range;
+    pass next_cursor from the previous page as cursor to continue.
+    """
+    account = _get_account(account_id)
+    try:
+        return await account.query_history(coin, action, start, end, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/account/summary")
+def get_account_summary(account_id: str = ACCOUNT_ID):
+    account = _get_account(account_id)
+    return {
+        "account_id": account.account_id,
+        "total_value": account.total_value,
+        "total_return_pct": account.total_return_pct,
+        **account.summary.to_dict()
+    }
+
+@app.get("/stats")
+def get_stats():
+    return {
+        "candle_cache": get_cache_stats(),
+        "analysis_coalescing": analysis_flight.stats,
+        "llm": llm_client.get_stats(),
+        "llm_replay": llm_client.get_replay_stats(),
+        "price_stream": price_stream.status(),
+        "ensemble": ensemble_stats.to_dict(),
+    }
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of stage latencies, upstream errors, cache and token counters."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"message": "Trading Bot Backend"}
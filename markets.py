@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Markets tracked by the agent and the batch endpoints.
+# Override with MARKETS as a comma separated list of symbols ("ETH,BTC,SOL"),
+# SYMBOL:market_id pairs ("ETH:0,BTC:1") or "all" for every active exchange market.
+DEFAULT_MARKETS = "ETH:0,BTC:1,SOL:2"
+
+# On-disk copy of the exchange metadata so cold starts don't depend on the API
+DEFAULT_CACHE_PATH = os.path.join(".cache", "markets.json")
+DEFAULT_REFRESH_SECONDS = 3600
+
+class MarketRegistry:
+    """
+    Exchange market metadata (symbol, tick size, size decimals) with O(1) lookups
+    by market_id and by symbol. Loaded once at startup from the exchange order books,
+    falling back to the disk cache, and refreshed in the background.
+    Set MARKETS_FIXTURE to a saved /orderBooks response to run fully offline.
+    """
+    def __init__(self):
+        self.by_id: Dict[int, Dict[str, Any]] = {}
+        self.by_symbol: Dict[str, Dict[str, Any]] = {}
+        self.last_refreshed: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def load(self, response: Dict[str, Any]):
+        """
+        Load a /orderBooks style response ({"order_books": [...]}).
+        Raises ValueError (keeping the current markets) if it holds none, e.g. an error body.
+        """
+        items = response.get("order_books", []) if isinstance(response, dict) else response
+        by_id = {}
+        by_symbol = {}
+        for item in items:
+            price_decimals = int(item.get("supported_price_decimals", item.get("price_decimals", 2)))
+            market = {
+                "market_id": int(item["market_id"]),
+                "symbol": str(item["symbol"]).upper(),
+                "status": item.get("status", "active"),
+                "price_decimals": price_decimals,
+                "size_decimals": int(item.get("supported_size_decimals", item.get("size_decimals", 4))),
+                "tick_size": 10 ** -price_decimals,
+            }
+            by_id[market["market_id"]] = market
+            by_symbol[market["symbol"]] = market
+        if not by_id:
+            raise ValueError(f"No order books in response: {str(response)[:200]}")
+        # Swap both maps at once so lookups never see a half-loaded registry
+        self.by_id, self.by_symbol = by_id, by_symbol
+
+    def load_file(self, path: str) -> bool:
+        try:
+            with open(path) as f:
+                self.load(json.load(f))
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load market metadata from {path}: {e}")
+            return False
+
+    async def refresh(self) -> bool:
+        """Fetch order book metadata from the exchange and update the disk cache."""
+        from candles import api
+
+        try:
+            response = await api.get_order_books()
+            self.load(response)
+            self.last_refreshed = time.time()
+        except Exception as e:
+            logger.error(f"Failed to refresh market metadata: {e}")
+            return False
+
+        cache_path = os.getenv("MARKETS_CACHE_PATH", DEFAULT_CACHE_PATH)
+        try:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            with open(cache_path, "w") as f:
+                json.dump(response, f)
+        except OSError as e:
+            logger.warning(f"Could not write market cache {cache_path}: {e}")
+
+        logger.info(f"Loaded {len(self.by_id)} markets from exchange")
+        return True
+
+    async def initialize(self):
+        fixture = os.getenv("MARKETS_FIXTURE")
+        if fixture:
+            self.load_file(fixture)
+            return
+
+        cache_path = os.getenv("MARKETS_CACHE_PATH", DEFAULT_CACHE_PATH)
+        if os.path.exists(cache_path) and self.load_file(cache_path):
+            logger.info(f"Loaded {len(self.by_id)} markets from {cache_path}")
+            # Serve from the cache right away and refresh in the background
+            return
+
+        await self.refresh()
+
+    def start_background_refresh(self):
+        if os.getenv("MARKETS_FIXTURE") or self._refresh_task is not None:
+            return
+        interval = float(os.getenv("MARKETS_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS))
+        self._refresh_task = asyncio.create_task(self._refresh_loop(interval))
+
+    async def _refresh_loop(self, interval: float):
+        while True:
+            # Refresh right away if startup was served from the disk cache
+            if self.last_refreshed is None or time.time() - self.last_refreshed >= interval:
+                await self.refresh()
+            await asyncio.sleep(interval)
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def get(self, market_id: int) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(market_id)
+
+    def get_symbol(self, market_id: int) -> Optional[str]:
+        market = self.by_id.get(market_id)
+        return market["symbol"] if market else None
+
+    def get_market_id(self, symbol: str) -> Optional[int]:
+        market = self.by_symbol.get(symbol.upper())
+        return market["market_id"] if market else None
+
+# Global registry, loaded in main.startup_event
+market_registry = MarketRegistry()
+
+def parse_markets(spec: str) -> List[Tuple[int, str]]:
+    """
+    Parse a MARKETS string into [(market_id, symbol), ...].
+    Bare symbols are resolved through the market registry.
+    """
+    if spec.strip().lower() == "all":
+        return [(m["market_id"], m["symbol"]) for m in market_registry.by_id.values() if m["status"] == "active"]
+
+    markets = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        symbol, _, market_id = item.partition(":")
+        symbol = symbol.strip().upper()
+        if market_id:
+            markets.append((int(market_id), symbol))
+            continue
+        resolved = market_registry.get_market_id(symbol)
+        if resolved is None:
+            logger.warning(f"Unknown market symbol '{symbol}' in MARKETS, skipping")
+            continue
+        markets.append((resolved, symbol))
+    return markets
+
+def get_market_universe() -> List[Tuple[int, str]]:
+    """Return the configured [(market_id, symbol), ...] list, read from MARKETS."""
+    return parse_markets(os.getenv("MARKETS", DEFAULT_MARKETS))
+
+def get_symbol(market_id: int) -> str:
+    symbol = market_registry.get_symbol(market_id)
+    if symbol:
+        return symbol
+    for mid, configured in get_market_universe():
+        if mid == market_id:
+            return configured
+    return "Unknown"
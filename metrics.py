@@ -0,0 +1,160 @@
+"""
+In-process metrics rendered in the Prometheus text format for GET /metrics.
+
+Summaries keep a sliding window of recent observations and report p50/p95/p99
+over it, plus a running sum and count. Recording is a perf_counter call and a
+deque append, cheap enough to leave on everywhere; quantiles are only sorted
+when /metrics is scraped.
+
+    @timed("execute_trade")          time a function (sync or async) as a stage
+    with STAGE_SECONDS.time(stage="x"): ...
+    UPSTREAM_ERRORS.inc(upstream="candles")
+"""
+import time
+import asyncio
+import functools
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+QUANTILES = (0.5, 0.95, 0.99)
+DEFAULT_WINDOW = 1024
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        k + '="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def _labels(self, key: Tuple) -> Dict[str, Any]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self._labels(k))} {v}" for k, v in self.values.items()]
+
+class Summary(_Metric):
+    kind = "summary"
+
+    def __init__(self, *args, window: int = DEFAULT_WINDOW, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.window = window
+        # key -> [recent observations, sum, count]
+        self.series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [deque(maxlen=self.window), 0.0, 0]
+        series[0].append(value)
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (recent, total, count) in self.series.items():
+            labels = self._labels(key)
+            values = sorted(recent)
+            for q in QUANTILES:
+                value = values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+                lines.append(f"{self.name}{_format_labels({**labels, 'quantile': q})} {value}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+_registry: List[_Metric] = []
+# Callbacks producing (name, type, help, [(labels, value)]) at scrape time, for state
+# that is already counted elsewhere (cache stats, scheduler runs, ...)
+_collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]] = []
+
+def counter(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    metric = Counter(name, documentation, labelnames)
+    _registry.append(metric)
+    return metric
+
+def summary(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Summary:
+    metric = Summary(name, documentation, labelnames)
+    _registry.append(metric)
+    return metric
+
+def register_collector(fn: Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]):
+    _collectors.append(fn)
+    return fn
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        for name, kind, documentation, samples in collect():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {value}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+STAGE_SECONDS = summary("agent_stage_seconds", "Time spent per agent cycle stage.", ("stage",))
+UPSTREAM_ERRORS = counter("upstream_errors_total", "Failed calls to upstream services.", ("upstream",))
+LLM_SECONDS = summary("llm_request_seconds", "LLM request latency, to the last streamed chunk.", ("model",))
+LLM_TOKENS = counter("llm_tokens_total", "Prompt and completion tokens reported by the LLM API.", ("model", "kind"))
+
+def timed(stage: str):
+    """Record the duration of every call (including failed ones) under agent_stage_seconds{stage}."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        return wrapper
+    return decorator
@@ -0,0 +1,219 @@
+"""
+Real-time trade prices pushed into the paper account, so stops and targets fire
+on the tick that crosses them instead of at the next agent cycle.
+
+A PriceFeed yields (symbol, price, timestamp) ticks:
+  LighterPriceFeed  exchange websocket (trade channel per market), reconnects with backoff
+  ReplayPriceFeed   recorded ticks from a JSON lines file or a list, for tests and offline runs
+
+PriceStream runs a feed in the background, keeps the latest price per symbol and hands
+each tick to the account. Configured from env: PRICE_STREAM_ENABLED, PRICE_STREAM_URL,
+PRICE_STREAM_REPLAY (ticks file, replaces the websocket), PRICE_STREAM_REPLAY_SPEED
+and PRICE_STALE_SECONDS.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM_URL = "wss://mainnet.zklighter.elliot.ai/stream"
+# Prices older than this are not used in place of the candle price
+DEFAULT_STALE_SECONDS = 10.0
+
+Tick = Tuple[str, float, float]
+
+class PriceFeed:
+    async def ticks(self) -> AsyncIterator[Tick]:
+        raise NotImplementedError
+        yield
+
+class LighterPriceFeed(PriceFeed):
+    """
+    Trade stream from the exchange websocket, one `trade/<market_id>` subscription per market.
+    Reconnects with capped exponential backoff (with jitter) and resubscribes; a connection
+    that goes quiet for `idle_timeout` seconds is treated as dead.
+    """
+    def __init__(self, markets: List[Tuple[int, str]], url: str = DEFAULT_STREAM_URL,
+                 idle_timeout: float = 60.0, max_backoff: float = 30.0):
+        self.symbols = {market_id: symbol for market_id, symbol in markets}
+        self.url = url
+        self.idle_timeout = idle_timeout
+        self.max_backoff = max_backoff
+        self.reconnects = 0
+
+    async def ticks(self) -> AsyncIterator[Tick]:
+        attempt = 0
+        async with aiohttp.ClientSession() as session:
+            while True:
+                try:
+                    async with session.ws_connect(self.url, heartbeat=20) as ws:
+                        for market_id in self.symbols:
+                            await ws.send_json({"type": "subscribe", "channel": f"trade/{market_id}"})
+                        logger.info(f"Price stream connected, {len(self.symbols)} markets")
+                        attempt = 0
+                        while True:
+                            msg = await ws.receive(timeout=self.idle_timeout)
+                            if msg.type != aiohttp.WSMsgType.TEXT:
+                                if msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                    break
+                                continue
+                            data = json.loads(msg.data)
+                            if data.get("type") == "ping":
+                                await ws.send_json({"type": "pong"})
+                                continue
+                            for tick in self._parse(data):
+                                yield tick
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    logger.warning(f"Price stream error: {e.__class__.__name__}: {e}")
+
+                attempt += 1
+                self.reconnects += 1
+                delay = min(self.max_backoff, 0.5 * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                logger.info(f"Price stream reconnecting in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def _parse(self, data: Dict[str, Any]) -> Iterable[Tick]:
+        # Only new trades: the "subscribed/trade" reply replays recent history
+        if data.get("type") != "update/trade":
+            return []
+        latest: Dict[str, Tick] = {}
+        # Trades carry their market_id; the channel name ("trade:<market_id>") is the fallback
+        channel_id = str(data.get("channel", "")).rpartition(":")[2]
+        for trade in data.get("trades", []):
+            market_id = trade.get("market_id", int(channel_id) if channel_id.isdigit() else None)
+            symbol = self.symbols.get(market_id)
+            if symbol is not None and trade.get("price") is not None:
+                timestamp = float(trade.get("timestamp") or time.time())
+                if timestamp > 1e11:
+                    # Milliseconds
+                    timestamp /= 1000
+                # One tick per market per message: the latest trade is the price
+                if symbol not in latest or timestamp >= latest[symbol][2]:
+                    latest[symbol] = (symbol, float(trade["price"]), timestamp)
+        return list(latest.values())
+
+class ReplayPriceFeed(PriceFeed):
+    """
+    Recorded ticks played back in order. `speed` scales the gaps between tick
+    timestamps (2.0 = twice as fast); 0 replays as fast as possible. Ticks are
+    re-stamped with the playback time so they pass the stream's age checks.
+    """
+    def __init__(self, ticks: Iterable[Tick], speed: float = 0.0):
+        self._ticks = list(ticks)
+        self.speed = speed
+
+    @classmethod
+    def from_file(cls, path: str, speed: float = 0.0) -> "ReplayPriceFeed":
+        """JSON lines of {"symbol", "price", "timestamp"}."""
+        ticks = []
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    t = json.loads(line)
+                    ticks.append((t["symbol"], float(t["price"]), float(t.get("timestamp", 0))))
+        return cls(ticks, speed)
+
+    async def ticks(self) -> AsyncIterator[Tick]:
+        previous = stamp = None
+        for tick in self._ticks:
+            if self.speed > 0 and previous is not None and tick[2] > previous:
+                await asyncio.sleep((tick[2] - previous) / self.speed)
+            else:
+                # Let other tasks run between ticks
+                await asyncio.sleep(0)
+            previous = tick[2]
+            # Strictly increasing, even for ticks recorded with the same timestamp
+            stamp = max(time.time(), stamp + 1e-6) if stamp is not None else time.time()
+            yield tick[0], tick[1], stamp
+
+TickHandler = Callable[[str, float], Awaitable[Any]]
+
+class PriceStream:
+    """
+    Runs a feed in the background and fans each tick out to the registered handlers.
+    Ticks that are not newer than the last one for their symbol, or already older than
+    stale_seconds (a backlog after a reconnect), are counted and dropped.
+    """
+    def __init__(self, stale_seconds: float = DEFAULT_STALE_SECONDS):
+        self.stale_seconds = stale_seconds
+        self.prices: Dict[str, float] = {}
+        self.updated_at: Dict[str, float] = {}
+        self.tick_times: Dict[str, float] = {}
+        self.handlers: List[TickHandler] = []
+        self.feed: Optional[PriceFeed] = None
+        self.stats = {"ticks": 0, "dropped_ticks": 0, "handler_errors": 0}
+        self._task: Optional[asyncio.Task] = None
+
+    def add_handler(self, handler: TickHandler):
+        self.handlers.append(handler)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, feed: PriceFeed):
+        if self.running:
+            return
+        self.feed = feed
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def wait(self):
+        """Wait for a finite feed (replay) to run out."""
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    async def _run(self):
+        async for symbol, price, timestamp in self.feed.ticks():
+            if timestamp <= self.tick_times.get(symbol, 0) or time.time() - timestamp > self.stale_seconds:
+                self.stats["dropped_ticks"] += 1
+                continue
+            self.tick_times[symbol] = timestamp
+            self.stats["ticks"] += 1
+            self.prices[symbol] = price
+            self.updated_at[symbol] = time.monotonic()
+            for handler in self.handlers:
+                try:
+                    await handler(symbol, price)
+                except Exception:
+                    self.stats["handler_errors"] += 1
+                    logger.exception(f"Price tick handler failed for {symbol}")
+
+    def fresh_prices(self) -> Dict[str, float]:
+        """Latest prices that are no older than stale_seconds."""
+        now = time.monotonic()
+        return {s: p for s, p in self.prices.items() if now - self.updated_at[s] <= self.stale_seconds}
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "running": self.running,
+            "feed": self.feed.__class__.__name__ if self.feed else None,
+            "reconnects": getattr(self.feed, "reconnects", 0),
+            **self.stats,
+            "prices": {s: {"price": p, "age": now - self.updated_at[s]} for s, p in self.prices.items()},
+        }
+
+def feed_from_env(markets: List[Tuple[int, str]]) -> PriceFeed:
+    replay_path = os.getenv("PRICE_STREAM_REPLAY")
+    if replay_path:
+        return ReplayPriceFeed.from_file(replay_path, float(os.getenv("PRICE_STREAM_REPLAY_SPEED", 1.0)))
+    return LighterPriceFeed(markets, os.getenv("PRICE_STREAM_URL", DEFAULT_STREAM_URL))
+
+# Shared stream, started/stopped with the app
+price_stream = PriceStream(float(os.getenv("PRICE_STALE_SECONDS", DEFAULT_STALE_SECONDS)))
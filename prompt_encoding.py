@@ -0,0 +1,107 @@
+"""
+Serializers for the ALL_INDICATOR_DATA block of the agent prompts.
+Token count drives both latency and cost of every LLM call, so besides the
+original JSON dump there are compact layouts with fixed precision and no
+repeated keys. Select one with PROMPT_ENCODING (json, table or csv).
+
+Run `python prompt_encoding.py [snapshot.json ...]` to compare token counts of
+each encoding on recorded market data (a market_data dict, or a sentiment_logs
+document containing one). Uses tiktoken when installed, otherwise ~4 chars/token.
+"""
+import os
+import sys
+import json
+from typing import Any, Callable, Dict, List
+
+# Series in the order they appear in the compact layouts, with their short column names
+SERIES_COLUMNS = [
+    ("midPrices", "mid"),
+    ("ema20", "ema20"),
+    ("ema50", "ema50"),
+    ("rsi7", "rsi7"),
+    ("rsi14", "rsi14"),
+    ("atr14", "atr14"),
+    ("macd", "macd"),
+]
+
+DEFAULT_PRECISION = 6
+
+def _fmt(value: Any, precision: int) -> str:
+    if value is None:
+        return ""
+    # Significant digits rather than decimals, so BTC and low-priced coins both stay readable
+    return f"{value:.{precision}g}"
+
+def encode_json(market_data: Dict[str, Any], precision: int = DEFAULT_PRECISION) -> str:
+    """Original layout: the raw nested dict as JSON."""
+    return json.dumps(market_data, default=str)
+
+def encode_table(market_data: Dict[str, Any], precision: int = DEFAULT_PRECISION) -> str:
+    """One line per series: `ema20: v1 v2 ...`, grouped by coin and timeframe."""
+    lines = ["Series are ordered oldest to newest."]
+    for coin, timeframes in market_data.items():
+        for timeframe, series in timeframes.items():
+            lines.append(f"{coin} {timeframe}")
+            for key, column in SERIES_COLUMNS:
+                values = series.get(key) or []
+                lines.append(f"{column}: " + " ".join(_fmt(v, precision) for v in values))
+    return "\n".join(lines)
+
+def encode_csv(market_data: Dict[str, Any], precision: int = DEFAULT_PRECISION) -> str:
+    """One CSV block per coin/timeframe, one row per bar, columns aligned to the newest bar."""
+    lines = ["Rows are bars ordered oldest to newest; empty cells have no value yet."]
+    for coin, timeframes in market_data.items():
+        for timeframe, series in timeframes.items():
+            lines.append(f"## {coin} {timeframe}")
+            lines.append(",".join(column for _, column in SERIES_COLUMNS))
+            columns = [series.get(key) or [] for key, _ in SERIES_COLUMNS]
+            rows = max((len(c) for c in columns), default=0)
+            for i in range(rows):
+                cells = []
+                for values in columns:
+                    # Shorter series are aligned to the end (newest bar)
+                    j = i - (rows - len(values))
+                    cells.append(_fmt(values[j], precision) if j >= 0 else "")
+                lines.append(",".join(cells))
+    return "\n".join(lines)
+
+ENCODERS: Dict[str, Callable[..., str]] = {
+    "json": encode_json,
+    "table": encode_table,
+    "csv": encode_csv,
+}
+
+def encode_market_data(market_data: Dict[str, Any], encoding: str = None, precision: int = None) -> str:
+    """Serialize market data for the prompt with the configured encoding."""
+    encoding = encoding or os.getenv("PROMPT_ENCODING", "json")
+    if encoding not in ENCODERS:
+        raise ValueError(f"Unknown prompt encoding '{encoding}', expected one of {list(ENCODERS)}")
+    if precision is None:
+        precision = int(os.getenv("PROMPT_PRECISION", DEFAULT_PRECISION))
+    return ENCODERS[encoding](market_data, precision)
+
+def count_tokens(text: str) -> int:
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # tiktoken missing, or its vocabulary can't be downloaded offline
+        return len(text) // 4
+    return len(encoding.encode(text))
+
+def load_snapshot(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        data = json.load(f)
+    return data.get("market_data", data)
+
+if __name__ == "__main__":
+    paths: List[str] = sys.argv[1:] or [os.path.join(os.path.dirname(__file__), "fixtures", "market_snapshot.json")]
+    for path in paths:
+        market_data = load_snapshot(path)
+        print(path)
+        baseline = None
+        for name in ENCODERS:
+            text = encode_market_data(market_data, name)
+            tokens = count_tokens(text)
+            baseline = baseline or tokens
+            print(f"  {name:6s} {tokens:7d} tokens {len(text):8d} chars  {tokens / baseline * 100:5.1f}%")
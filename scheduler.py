@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+OVERLAP_POLICIES = ("skip", "queue")
+
+class CycleScheduler:
+    """
+    Runs an agent cycle in the background, aligned to bar closes.
+    Fires `interval` seconds apart on the bar boundary plus a random jitter, and can
+    also be triggered manually. Runs never overlap: a trigger that arrives while a
+    cycle is running is dropped ("skip") or runs once after it ("queue").
+    """
+    def __init__(self, name: str, job: Callable[[], Awaitable[Any]], interval: int = 900,
+                 jitter: float = 5.0, overlap: str = "skip", history: int = 50):
+        if overlap not in OVERLAP_POLICIES:
+            raise ValueError(f"Unknown overlap policy '{overlap}', expected one of {OVERLAP_POLICIES}")
+        self.name = name
+        self.job = job
+        self.interval = interval
+        self.jitter = jitter
+        self.overlap = overlap
+        self.durations: deque = deque(maxlen=history)
+        self.last_result: Any = None
+        self.last_started: Optional[str] = None
+        self.last_finished: Optional[str] = None
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self._current: Optional[asyncio.Task] = None
+        self._pending = False
+        self._loop_task: Optional[asyncio.Task] = None
+        self._listeners: List[asyncio.Queue] = []
+
+    @property
+    def running(self) -> bool:
+        return self._current is not None and not self._current.done()
+
+    def start(self):
+        """Start firing cycles on bar closes."""
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._schedule_loop())
+            logger.info(f"{self.name} scheduler started (every {self.interval}s, overlap={self.overlap})")
+
+    async def stop(self):
+        for task in (self._loop_task, self._current):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._loop_task = None
+        self._current = None
+
+    def seconds_until_next_run(self) -> float:
+        now = time.time()
+        next_close = (now // self.interval + 1) * self.interval
+        # Small positive jitter so the closed bar is available upstream
+        return next_close - now + random.uniform(0, self.jitter)
+
+    async def _schedule_loop(self):
+        while True:
+            await asyncio.sleep(self.seconds_until_next_run())
+            self.trigger()
+
+    def trigger(self) -> str:
+        """Start a cycle unless one is running. Returns "started", "queued" or "skipped"."""
+        if self.running:
+            if self.overlap == "queue":
+                self._pending = True
+                return "queued"
+            self.skipped += 1
+            logger.info(f"{self.name} cycle still running, skipping trigger")
+            return "skipped"
+
+        self._current = asyncio.create_task(self._run())
+        return "started"
+
+    async def wait(self) -> Any:
+        """Wait for the running (and queued) cycle to finish and return the last result."""
+        while self.running:
+            await asyncio.shield(self._current)
+        return self.last_result
+
+    def subscribe(self) -> asyncio.Queue:
+        """Queue of (event, data) tuples published by the job; every run ends with ("done", result)."""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._listeners.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._listeners:
+            self._listeners.remove(queue)
+
+    def publish(self, event: str, data: Any = None):
+        for queue in self._listeners:
+            queue.put_nowait((event, data))
+
+    async def _run(self):
+        while True:
+            self.runs += 1
+            self.last_started = datetime.utcnow().isoformat()
+            start = time.perf_counter()
+            try:
+                self.last_result = await self.job()
+            except Exception as e:
+                logger.exception(f"{self.name} cycle failed")
+                self.last_result = {"status": "error", "message": str(e)}
+            if isinstance(self.last_result, dict) and self.last_result.get("status") == "error":
+                self.failures += 1
+            self.durations.append(time.perf_counter() - start)
+            self.last_finished = datetime.utcnow().isoformat()
+            self.publish("done", self.last_result)
+
+            if not self._pending:
+                break
+            self._pending = False
+
+    def status(self) -> Dict[str, Any]:
+        durations = list(self.durations)
+        return {
+            "name": self.name,
+            "running": self.running,
+            "scheduled": self._loop_task is not None,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "last_started": self.last_started,
+            "last_finished": self.last_finished,
+            "last_duration": durations[-1] if durations else None,
+            "avg_duration": sum(durations) / len(durations) if durations else None,
+            "max_duration": max(durations) if durations else None,
+        }
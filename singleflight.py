@@ -0,0 +1,55 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+class SingleFlight:
+    """
+    In-flight request coalescing.
+    Concurrent calls with the same key await one shared task instead of each
+    running the work, and a finished result is reused for `ttl` seconds.
+    Failures are shared with the waiters of that flight but never cached.
+    """
+    def __init__(self, ttl: float = 0.0):
+        self.ttl = ttl
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._results: Dict[Hashable, Tuple[float, Any]] = {}
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0, "reused": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats["calls"] += 1
+
+        cached = self._results.get(key)
+        if cached is not None:
+            if time.monotonic() < cached[0]:
+                self.stats["reused"] += 1
+                return cached[1]
+            del self._results[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["executions"] += 1
+            task = asyncio.ensure_future(self._run(key, fn))
+            self._inflight[key] = task
+
+        # Shield so one cancelled caller doesn't cancel the work for everyone else
+        return await asyncio.shield(task)
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            result = await fn()
+            if self.ttl > 0:
+                self._prune()
+                self._results[key] = (time.monotonic() + self.ttl, result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def _prune(self):
+        now = time.monotonic()
+        for expired in [k for k, (expires, _) in self._results.items() if expires <= now]:
+            del self._results[expired]
+
+    def clear(self):
+        self._results.clear()
@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+from indicators import (
+    INDICATOR_BACKENDS, IndicatorEngine, StreamingEMA, StreamingRSI, calculate_all_indicators, calculate_ema,
+    calculate_rsi, get_indicator_backend, set_indicator_backend,
+)
+
+
+def make_candles(count, seed=0):
+    rng = random.Random(seed)
+    price = 100.0
+    candles = []
+    for i in range(count):
+        open_ = price
+        price += rng.uniform(-2, 2)
+        candles.append({
+            "timestamp": i * 900,
+            "open": open_,
+            "high": max(open_, price) + rng.uniform(0, 1),
+            "low": min(open_, price) - rng.uniform(0, 1),
+            "close": price,
+        })
+    return candles
+
+
+@pytest.fixture
+def candles():
+    return make_candles(300)
+
+
+@pytest.fixture
+def restore_backend():
+    previous = get_indicator_backend()
+    yield
+    set_indicator_backend(previous)
+
+
+def test_engine_matches_batch(candles):
+    engine = IndicatorEngine.from_candles(candles[:200])
+    assert engine.get_indicators(50) == calculate_all_indicators(candles[:200], 50)
+    for i in range(200, len(candles)):
+        engine.update(candles[i])
+        assert engine.get_indicators(50) == calculate_all_indicators(candles[:i + 1], 50)
+
+
+def test_engine_revises_the_forming_bar(candles):
+    engine = IndicatorEngine.from_candles(candles[:200])
+    for i in range(200, len(candles)):
+        # Provisional versions of the bar first, then the final one
+        engine.update({**candles[i], "close": candles[i]["close"] + 5})
+        engine.update({**candles[i], "close": candles[i]["close"] - 3})
+        engine.update(candles[i])
+        assert engine.get_indicators(50) == calculate_all_indicators(candles[:i + 1], 50)
+
+
+def test_engine_revision_during_warmup(candles):
+    # Revisions before the slow indicators have a value must not leave stray entries
+    engine = IndicatorEngine()
+    for i in range(60):
+        engine.update({**candles[i], "close": candles[i]["close"] * 1.01})
+        engine.update(candles[i])
+        assert engine.get_indicators(20) == calculate_all_indicators(candles[:i + 1], 20)
+
+
+def test_engine_rejects_older_candle(candles):
+    engine = IndicatorEngine.from_candles(candles[:10])
+    with pytest.raises(ValueError):
+        engine.update(candles[5])
+
+
+def test_streaming_replace_last():
+    closes = [c["close"] for c in make_candles(100, seed=1)]
+    ema, rsi = StreamingEMA(20), StreamingRSI(14)
+    streamed_ema, streamed_rsi = [], []
+    for price in closes:
+        ema.update(price * 2)
+        rsi.update(price * 2)
+        streamed_ema.append(ema.update(price, replace_last=True))
+        streamed_rsi.append(rsi.update(price, replace_last=True))
+    assert [v for v in streamed_ema if v is not None] == calculate_ema(closes, 20)
+    assert [v for v in streamed_rsi if v is not None] == calculate_rsi(closes, 14)
+
+
+@pytest.mark.parametrize("count", [1, 14, 30, 60, 300])
+def test_numpy_backend_matches_python(count, candles, restore_backend):
+    pytest.importorskip("numpy")
+    set_indicator_backend("numpy")
+    vectorized = calculate_all_indicators(candles[:count], 20)
+    set_indicator_backend("python")
+    assert vectorized == calculate_all_indicators(candles[:count], 20)
+
+
+def test_unknown_backend(restore_backend):
+    with pytest.raises(ValueError):
+        set_indicator_backend("fortran")
+    assert get_indicator_backend() in INDICATOR_BACKENDS
@@ -1,24 +1,59 @@
 import os
 import json
+import time
+import hashlib
 import logging
 import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from typing import Dict, Any, List
-from openai import AsyncOpenAI
+from typing import Dict, Any, Callable, List, Optional
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from bson.errors import InvalidId
 import certifi
-from data import get_full_analysis
+from data import get_batch_analysis
+from llm import llm_client
+from json_stream import JsonArrayStreamParser
+from ensemble import run_ensemble, get_agent_models, get_agent_deadline
+from prompt_encoding import encode_market_data
+from price_stream import price_stream
+from triggers import TriggerIndex, crossed_level
+from metrics import timed, UPSTREAM_ERRORS
 
 from prompt import SYSTEM_PROMPT, USER_PROMPT, SENTIMENT_SYSTEM_PROMPT, SENTIMENT_USER_PROMPT
 
-async def run_sentiment_analysis():
-    """Run market regime analysis without trading"""
+# Sentiment responses keyed on a hash of model + prompt, valid until the next 15m bar close.
+# Unchanged indicator data means an identical prompt, so the paid call is skipped.
+SENTIMENT_CACHE_INTERVAL = 900
+_sentiment_cache: Dict[str, Dict[str, Any]] = {}
+
+def _prompt_fingerprint(model: str, messages: List[Dict[str, str]]) -> str:
+    payload = json.dumps({"model": model, "messages": messages}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _get_cached_sentiment(key: str) -> Optional[Dict[str, Any]]:
+    entry = _sentiment_cache.get(key)
+    if entry and time.time() < entry["expires_at"]:
+        return entry["analysis"]
+    # Drop anything that has expired
+    now = time.time()
+    for k in [k for k, v in _sentiment_cache.items() if v["expires_at"] <= now]:
+        del _sentiment_cache[k]
+    return None
+
+async def run_sentiment_analysis(account: Optional["PaperTradingAccount"] = None):
+    """
+    Run market regime analysis without trading.
+    Identical prompts within the same 15m bar are answered from cache (not logged again).
+    The result is logged through `account`'s DB connection, the main account's by default.
+    """
     
     # 1. Gather Data
     market_data, _ = await get_all_market_data()
     
     # 2. Format Prompt
-    market_state_str = json.dumps(market_data, default=str)
+    market_state_str = encode_market_data(market_data)
     
     formatted_user_prompt = SENTIMENT_USER_PROMPT.format(
         ALL_INDICATOR_DATA=market_state_str
@@ -29,21 +64,24 @@ async def run_sentiment_analysis():
         {"role": "user", "content": formatted_user_prompt}
     ]
     
-    # 3. Call AI
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if not api_key:
-        logger.error("OPENROUTER_API_KEY not found in env")
+    # 3. Call AI (shared client, started with the app)
+    if not llm_client.start():
         return {"status": "error", "message": "Missing API Key"}
-        
-    client = AsyncOpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=api_key,
-    )
     
     model = "google/gemini-2.5-flash-lite"
     
+    cache_key = _prompt_fingerprint(model, full_prompt)
+    cached = _get_cached_sentiment(cache_key)
+    if cached is not None:
+        logger.info("Sentiment Analysis served from cache")
+        return {
+            "status": "success",
+            "analysis": cached,
+            "cached": True
+        }
+    
     try:
-        completion = await client.chat.completions.create(
+        completion = await llm_client.chat(
             model=model,
             messages=full_prompt,
             temperature=0.1
@@ -61,16 +99,24 @@ async def run_sentiment_analysis():
         
         analysis_data = json.loads(clean_content)
         
-        # Ensure DB is connected
-        if demo_account.collection is None:
-            await demo_account.initialize()
+        now = time.time()
+        _sentiment_cache[cache_key] = {
+            "analysis": analysis_data,
+            "expires_at": (now // SENTIMENT_CACHE_INTERVAL + 1) * SENTIMENT_CACHE_INTERVAL,
+        }
+        
+        if account is None:
+            # Ensure DB is connected
+            account = demo_account
+            if account.collection is None:
+                await account.initialize()
 
         log_data = {
             "timestamp": datetime.utcnow().isoformat(),
             "market_data": market_data,
             "analysis": analysis_data
         }
-        await demo_account.log_sentiment_analysis(log_data)
+        await account.log_sentiment_analysis(log_data)
         
         return {
             "status": "success",
@@ -87,40 +133,131 @@ logger = logging.getLogger(__name__)
 
 # Constants
 INITIAL_BALANCE = 1000.0
-MARKET_IDS = {
-    "ETH": 0,
-    "BTC": 1,
-    "SOL": 2
-}
+ACCOUNT_ID = "account_main"
+# Trade events kept in memory for /account; the full history lives in the trade_history collection
+RECENT_HISTORY_SIZE = 100
+# Account document persistence: "sync" writes opens/closes before returning,
+# "batched" leaves every write to the write-behind flush, "off" never writes (backtests)
+DURABILITY_MODES = ("sync", "batched", "off")
+# The batch() scopes open in the current task, by id(account): {"open", "critical"}. Task-local,
+# so one task's batch never defers another task's writes (a price tick closing a position).
+# Copied on every set, never mutated in place, so tasks don't share the mapping
+_batch_scopes: ContextVar[Optional[Dict[int, Dict[str, bool]]]] = ContextVar("account_batch_scopes", default=None)
 
-class PaperTradingAccount:
+class TradeSummary:
+    """
+    Running aggregates over closed trades, updated once per close instead of
+    recomputed over the whole history: realized PnL by coin, win rate, trade
+    count and max drawdown of the realized equity curve.
+    """
     def __init__(self, initial_balance: float = INITIAL_BALANCE):
         self.initial_balance = initial_balance
+        self.trade_count = 0
+        self.wins = 0
+        self.realized_pnl = 0.0
+        self.pnl_by_coin: Dict[str, float] = {}
+        self.peak_equity = initial_balance
+        self.max_drawdown = 0.0
+        self.max_drawdown_pct = 0.0
+
+    def record_close(self, coin: str, pnl: float):
+        self.trade_count += 1
+        if pnl > 0:
+            self.wins += 1
+        self.realized_pnl += pnl
+        self.pnl_by_coin[coin] = self.pnl_by_coin.get(coin, 0.0) + pnl
+
+        equity = self.initial_balance + self.realized_pnl
+        self.peak_equity = max(self.peak_equity, equity)
+        drawdown = self.peak_equity - equity
+        if drawdown > self.max_drawdown:
+            self.max_drawdown = drawdown
+            self.max_drawdown_pct = (drawdown / self.peak_equity) * 100.0 if self.peak_equity else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trade_count": self.trade_count,
+            "wins": self.wins,
+            "win_rate": (self.wins / self.trade_count) * 100.0 if self.trade_count else 0.0,
+            "realized_pnl": self.realized_pnl,
+            "pnl_by_coin": self.pnl_by_coin,
+            "peak_equity": self.peak_equity,
+            "max_drawdown": self.max_drawdown,
+            "max_drawdown_pct": self.max_drawdown_pct,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], initial_balance: float = INITIAL_BALANCE) -> "TradeSummary":
+        summary = cls(initial_balance)
+        for key in ("trade_count", "wins", "realized_pnl", "pnl_by_coin", "peak_equity", "max_drawdown", "max_drawdown_pct"):
+            if key in data:
+                setattr(summary, key, data[key])
+        return summary
+
+class PaperTradingAccount:
+    def __init__(self, initial_balance: float = INITIAL_BALANCE, account_id: str = ACCOUNT_ID,
+                 durability: Optional[str] = None, clock: Optional[Callable[[], datetime]] = None):
+        self.initial_balance = initial_balance
+        self.account_id = account_id
+        # Time stamped on positions and trade events; the backtester passes the bar time
+        self.clock = clock or datetime.utcnow
         self.cash = initial_balance
         self.positions: Dict[str, Dict[str, Any]] = {} 
+        # Most recent trade events only (oldest to newest)
         self.history: List[Dict[str, Any]] = []
+        self.summary = TradeSummary(initial_balance)
         self.db_client = None
         self.db = None
         self.collection = None
+        self.history_collection = None
+        # Write-behind state: mutations mark the account dirty and are coalesced into one write
+        self.durability = durability or os.getenv("ACCOUNT_DURABILITY", "sync")
+        if self.durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown ACCOUNT_DURABILITY '{self.durability}', expected one of {DURABILITY_MODES}")
+        self.flush_interval = float(os.getenv("ACCOUNT_FLUSH_SECONDS", 1.0))
+        self._dirty = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self._save_lock = asyncio.Lock()
+        # Held while trades, stops and price updates change cash/positions
+        self.lock = asyncio.Lock()
+        # Index the stop/target levels of the open positions are registered in, keyed
+        # (account_id, coin); AccountManager replaces it with one shared by every account
+        self.triggers = TriggerIndex()
         # DO NOT load state in __init__ as it requires async
 
-    async def initialize(self):
-        """Initialize MongoDB connection and load state"""
-        mongo_uri = os.getenv("MONGO_URI")
-        if not mongo_uri:
-            logger.error("MONGO_URI not found in env")
-            return
+    async def initialize(self, db=None):
+        """Initialize MongoDB connection and load state. Pass db to share another account's connection."""
+        if db is None:
+            mongo_uri = os.getenv("MONGO_URI")
+            if not mongo_uri:
+                logger.error("MONGO_URI not found in env")
+                return
 
         try:
-            self.db_client = AsyncIOMotorClient(mongo_uri, tlsCAFile=certifi.where())
-            self.db = self.db_client.get_database("trading_bot")
+            if db is None:
+                self.db_client = AsyncIOMotorClient(mongo_uri, tlsCAFile=certifi.where())
+                db = self.db_client.get_database("trading_bot")
+            self.db = db
             self.collection = self.db.get_collection("account_state")
+            self.history_collection = self.db.get_collection("trade_history")
             self.sentiment_collection = self.db.get_collection("sentiment_logs")
-            logger.info("Connected to MongoDB")
+            await self.history_collection.create_index([("account_id", 1), ("time", -1)])
+            await self.history_collection.create_index([("account_id", 1), ("coin", 1), ("time", -1)])
+            # query_history pages newest first on _id
+            await self.history_collection.create_index([("account_id", 1), ("_id", -1)])
+            await self.history_collection.create_index([("account_id", 1), ("coin", 1), ("_id", -1)])
+            logger.info(f"Connected to MongoDB ({self.account_id})")
             await self.load_state()
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
 
+    def set_initial_balance(self, balance: float):
+        """Configured starting balance. Cash of saved state, once loaded, is kept."""
+        self.initial_balance = balance
+        if self.collection is None and not self.positions and not self.history:
+            self.cash = balance
+            self.summary = TradeSummary(balance)
+
     async def log_sentiment_analysis(self, data: Dict[str, Any]):
         if self.sentiment_collection is None:
             return
@@ -136,12 +273,19 @@ class PaperTradingAccount:
             return
 
         try:
-            # We use a fixed ID for the single account
-            data = await self.collection.find_one({"_id": "account_main"})
+            data = await self.collection.find_one({"_id": self.account_id})
             if data:
                 self.cash = float(data.get("cash", self.initial_balance))
+                self._unindex_positions()
                 self.positions = data.get("positions", {})
-                self.history = data.get("history", [])
+                self._reindex_positions()
+                if data.get("history"):
+                    await self._migrate_embedded_history(data["history"])
+                self.history = await self.get_recent_history(RECENT_HISTORY_SIZE)
+                if "summary" in data:
+                    self.summary = TradeSummary.from_dict(data["summary"], self.initial_balance)
+                else:
+                    await self._rebuild_summary()
                 logger.info("Account state loaded from MongoDB")
             else:
                 logger.info("No existing account state found, starting fresh.")
@@ -149,21 +293,210 @@ class PaperTradingAccount:
         except Exception as e:
             logger.error(f"Failed to load state from DB: {e}")
 
-    async def save_state(self):
-        if self.collection is None:
+    def _index_position(self, coin: str):
+        pos = self.positions[coin]
+        self.triggers.add(coin, (self.account_id, coin), pos["sign"], pos.get("stop_loss"), pos.get("take_profit"))
+
+    def _unindex_positions(self):
+        for coin in self.positions:
+            self.triggers.remove((self.account_id, coin))
+
+    def _reindex_positions(self):
+        for coin in self.positions:
+            self._index_position(coin)
+
+    def use_triggers(self, triggers: TriggerIndex):
+        """Register this account's stop/target levels in the given (shared) index."""
+        self._unindex_positions()
+        self.triggers = triggers
+        self._reindex_positions()
+
+    async def _migrate_embedded_history(self, history: List[Dict[str, Any]]):
+        """Move a legacy history array from the account document into trade_history."""
+        await self.history_collection.insert_many(
+            [{**event, "account_id": self.account_id} for event in history]
+        )
+        await self.collection.update_one({"_id": self.account_id}, {"$unset": {"history": ""}})
+        logger.info(f"Migrated {len(history)} history events to trade_history")
+
+    async def _rebuild_summary(self):
+        """One-off rebuild of the trade summary for accounts created before it existed."""
+        self.summary = TradeSummary(self.initial_balance)
+        cursor = self.history_collection.find(
+            {"account_id": self.account_id, "action": "close"}, {"coin": 1, "pnl": 1}
+        ).sort("time", 1)
+        async for event in cursor:
+            self.summary.record_close(event.get("coin"), float(event.get("pnl", 0.0)))
+        await self.save_state()
+
+    async def query_history(self, coin: Optional[str] = None, action: Optional[str] = None,
+                            start: Optional[str] = None, end: Optional[str] = None,
+                            cursor: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+        """
+        Page through trade history, newest first.
+        start/end are ISO timestamps; pass the returned next_cursor to get the following page.
+        Raises ValueError for an invalid cursor.
+        """
+        if self.history_collection is None:
+            return self._query_recent_history(coin, action, start, end, cursor, limit)
+
+        query: Dict[str, Any] = {"account_id": self.account_id}
+        if coin:
+            query["coin"] = coin
+        if action:
+            query["action"] = action
+        if start or end:
+            query["time"] = {}
+            if start:
+                query["time"]["$gte"] = start
+            if end:
+                query["time"]["$lte"] = end
+        if cursor:
+            try:
+                query["_id"] = {"$lt": ObjectId(cursor)}
+            except (InvalidId, TypeError):
+                raise ValueError(f"Invalid cursor: {cursor}")
+
+        docs = await self.history_collection.find(query, {"account_id": 0}).sort("_id", -1).limit(limit).to_list(length=limit)
+        next_cursor = str(docs[-1]["_id"]) if len(docs) == limit else None
+        for doc in docs:
+            doc.pop("_id")
+        return {"items": docs, "next_cursor": next_cursor}
+
+    def _query_recent_history(self, coin, action, start, end, cursor, limit) -> Dict[str, Any]:
+        # No DB: page over the in-memory recent events, cursor is an offset
+        try:
+            offset = int(cursor) if cursor else 0
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        events = [
+            e for e in reversed(self.history)
+            if (not coin or e.get("coin") == coin)
+            and (not action or e.get("action") == action)
+            and (not start or e.get("time", "") >= start)
+            and (not end or e.get("time", "") <= end)
+        ]
+        page = events[offset:offset + limit]
+        next_cursor = str(offset + limit) if offset + limit < len(events) else None
+        return {"items": page, "next_cursor": next_cursor}
+
+    async def get_recent_history(self, limit: int) -> List[Dict[str, Any]]:
+        if self.history_collection is None:
+            return self.history[-limit:]
+        cursor = self.history_collection.find(
+            {"account_id": self.account_id}, {"_id": 0, "account_id": 0}
+        ).sort("time", -1).limit(limit)
+        events = await cursor.to_list(length=limit)
+        events.reverse()
+        return events
+
+    async def record_event(self, event: Dict[str, Any]):
+        """Append one trade event: a single insert instead of rewriting the account document."""
+        self.history.append(event)
+        if len(self.history) > RECENT_HISTORY_SIZE:
+            del self.history[:-RECENT_HISTORY_SIZE]
+
+        if self.history_collection is None or self.durability == "off":
             return
+        try:
+            # Insert a copy, insert_one adds an ObjectId _id to the document it is given
+            await self.history_collection.insert_one({**event, "account_id": self.account_id})
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(upstream="mongo")
+            logger.error(f"Failed to save trade event to DB: {e}")
+
+    @timed("save_state")
+    async def save_state(self) -> bool:
+        if self.collection is None:
+            return True
 
         try:
             data = {
-                "_id": "account_main",
+                "_id": self.account_id,
                 "cash": self.cash,
                 "positions": self.positions,
-                "history": self.history,
+                "summary": self.summary.to_dict(),
                 "last_updated": datetime.utcnow().isoformat()
             }
-            await self.collection.replace_one({"_id": "account_main"}, data, upsert=True)
+            await self.collection.replace_one({"_id": self.account_id}, data, upsert=True)
+            return True
         except Exception as e:
+            UPSTREAM_ERRORS.inc(upstream="mongo")
             logger.error(f"Failed to save state to DB: {e}")
+            return False
+
+    async def flush(self):
+        """Write the account document if anything changed since the last write."""
+        async with self._save_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            try:
+                saved = await self.save_state()
+            except asyncio.CancelledError:
+                # Cancelled mid-write (shutdown, a deadline): the changes are still pending
+                self._dirty = True
+                raise
+            if not saved:
+                # Keep the changes pending so the next flush retries them
+                self._dirty = True
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _persist(self, critical: bool = False):
+        """
+        Persist after a mutation. Opens/closes (critical) are written before returning
+        in "sync" durability mode; everything else is coalesced by the write-behind flush.
+        Inside a batch() opened by the current task the write is deferred to its end.
+        """
+        if self.durability == "off":
+            return
+        self._dirty = True
+        scope = self._batch_scope()
+        if scope is not None and scope["open"]:
+            scope["critical"] = scope["critical"] or critical
+            return
+        if critical and self.durability == "sync":
+            await self.flush()
+        else:
+            self._schedule_flush()
+
+    def _batch_scope(self) -> Optional[Dict[str, bool]]:
+        return (_batch_scopes.get() or {}).get(id(self))
+
+    @asynccontextmanager
+    async def batch(self):
+        """
+        Coalesce every state change the current task makes inside the block into (at most)
+        one write. Changes made by other tasks meanwhile are persisted as usual.
+        """
+        outer = self._batch_scope()
+        if outer is not None and outer["open"]:
+            # Nested: the outermost batch writes
+            yield self
+            return
+        scope = {"open": True, "critical": False}
+        token = _batch_scopes.set({**(_batch_scopes.get() or {}), id(self): scope})
+        try:
+            yield self
+        finally:
+            # Tasks started inside the batch inherit the scope; once closed they write directly
+            scope["open"] = False
+            _batch_scopes.reset(token)
+            if scope["critical"]:
+                await self._persist(critical=True)
+
+    async def close(self):
+        """Flush pending changes, call on shutdown."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
 
     @property
     def total_value(self) -> float:
@@ -192,6 +525,7 @@ class PaperTradingAccount:
             return
             
         pos = self.positions.pop(coin)
+        self.triggers.remove((self.account_id, coin))
         margin = pos['margin']
         entry = pos['entry_price']
         qty = pos['quantity']
@@ -203,67 +537,75 @@ class PaperTradingAccount:
             
         returned_amount = margin + pnl
         self.cash += returned_amount
+        self.summary.record_close(coin, pnl)
         
         logger.info(f"Closed {coin} ({reason}). PnL: {pnl:.2f}. New Balance: {self.cash:.2f}")
-        self.history.append({
+        await self.record_event({
             "action": "close", 
             "coin": coin, 
             "price": current_price, 
             "pnl": pnl, 
             "reason": reason,
-            "time": datetime.utcnow().isoformat(), 
+            "time": self.clock().isoformat(), 
             "result": "CLOSED"
         })
-        await self.save_state()
+        await self._persist(critical=True)
 
     async def update_positions(self, current_prices: Dict[str, float]):
         """Update PnL and check for Stops/Take Profits"""
         state_changed = False
-        # Iterate over a copy since we might modify the dict (close positions)
-        for symbol, pos in list(self.positions.items()):
-            if symbol in current_prices:
-                curr = current_prices[symbol]
+        # Stops/targets hit on the same tick are persisted together in one write
+        async with self.batch():
+            for symbol, curr in current_prices.items():
+                pos = self.positions.get(symbol)
+                if pos is None or not curr or curr <= 0:
+                    continue
                 entry = pos['entry_price']
                 qty = pos['quantity']
-                
+            
                 if pos['sign'] == "LONG":
                     unrealized = (curr - entry) * qty
                 else:
                     unrealized = (entry - curr) * qty
-                
+            
                 if pos.get('unrealized_pnl') != unrealized:
                     pos['unrealized_pnl'] = unrealized
                     state_changed = True
-                
-                # Check Stop Loss
-                sl = pos.get('stop_loss')
-                if sl:
-                    if pos['sign'] == "LONG" and curr <= sl:
-                        await self.close_position(symbol, curr, reason="STOP_LOSS")
-                        continue
-                    elif pos['sign'] == "SHORT" and curr >= sl:
-                        await self.close_position(symbol, curr, reason="STOP_LOSS")
-                        continue
-                
-                # Check Take Profit
-                tp = pos.get('take_profit')
-                if tp:
-                    if pos['sign'] == "LONG" and curr >= tp:
-                         await self.close_position(symbol, curr, reason="TAKE_PROFIT")
-                         continue
-                    elif pos['sign'] == "SHORT" and curr <= tp:
-                         await self.close_position(symbol, curr, reason="TAKE_PROFIT")
-                         continue
+            
+                # At most one position per coin, so its levels are checked directly here;
+                # the shared index serves streamed ticks across all accounts (accounts.py)
+                reason = crossed_level(pos['sign'], pos.get('stop_loss'), pos.get('take_profit'), curr)
+                if reason:
+                    await self.close_position(symbol, curr, reason=reason)
         
-        # Save if PnL updated usually fine, or just on close. 
-        # Persistence of PnL is nice for UI to see it without re-fetch.
+        # Mark-to-market PnL alone never triggers a write: it is marked dirty and
+        # goes out with the next open/close or shutdown flush (the UI reads it from memory).
         if state_changed:
-            await self.save_state()
+            self._dirty = True
+
+    async def close_triggered(self, coin: str, price: float, reason: str):
+        """Close a position whose stop/target the shared index reported crossed."""
+        async with self.lock:
+            pos = self.positions.get(coin)
+            if pos is None or price <= 0:
+                return
+            # The index entry was removed before the lock was held: the position may have
+            # been closed and reopened since, with levels this price does not cross
+            reason = crossed_level(pos['sign'], pos.get('stop_loss'), pos.get('take_profit'), price)
+            if reason is None:
+                self._index_position(coin)
+                return
+            await self.close_position(coin, price, reason=reason)
 
+    @timed("execute_trade")
     async def execute_trade(self, decision: Dict[str, Any], current_price: float):
         signal = decision.get("signal")
         coin = decision.get("coin")
         
+        if signal in ["buy_to_enter", "sell_to_enter", "close"] and (not current_price or current_price <= 0):
+            logger.warning(f"No valid price for {coin} ({current_price}), skipping {signal}")
+            return
+        
         if signal in ["buy_to_enter", "sell_to_enter"]:
             if coin in self.positions:
                 logger.warning(f"Position already exists for {coin}, skipping {signal}")
@@ -336,16 +678,17 @@ class PaperTradingAccount:
                 "stop_loss": stop_loss,
                 "take_profit": decision.get("profit_target"),
                 "unrealized_pnl": 0.0,
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": self.clock().isoformat()
             }
+            self._index_position(coin)
             
             logger.info(f"Executed {signal} on {coin}. "
                         f"Price: {current_price}, Qty: {quantity:.4f}, Lev: {leverage}x. "
                         f"Margin: {margin_required:.2f} (Limit: {max_margin_allowed:.2f}). "
                         f"Risk: {risk_per_share*quantity:.2f} (Limit: {max_risk_allowed:.2f})")
                         
-            self.history.append({"action": signal, "coin": coin, "price": current_price, "time": datetime.utcnow().isoformat(), "result": "OPEN"})
-            await self.save_state()
+            await self.record_event({"action": signal, "coin": coin, "price": current_price, "time": self.clock().isoformat(), "result": "OPEN"})
+            await self._persist(critical=True)
 
         elif signal == "close":
              await self.close_position(coin, current_price, reason="SIGNAL")
@@ -356,17 +699,16 @@ class PaperTradingAccount:
 # Global Account Instance
 demo_account = PaperTradingAccount()
 
+@timed("market_data")
 async def get_all_market_data():
     """Fetch data for all tracked markets"""
-    import asyncio
+    # Markets come from the configured universe (MARKETS env, defaults to ETH/BTC/SOL)
+    batch = await get_batch_analysis()
+    for err in batch["errors"]:
+        logger.warning(f"Skipping {err['symbol']} (market {err['market_id']}): {err['error']}")
+    results = batch["results"]
     
-    # IDs defined in data.py logic: ETH=0, BTC=1, SOL=2
-    ids = [(0, "ETH"), (1, "BTC"), (2, "SOL")]
-    
-    tasks = [get_full_analysis(mid) for mid, _ in ids]
-    results = await asyncio.gather(*tasks)
-    
-    # Results is a list of dicts: { "symbol": "BTC", "indicator_data": {...} }
+    # Results is a list of dicts: { "market_id": 1, "symbol": "BTC", "indicator_data": {...} }
     # We want a dict: { "BTC": { ... }, "ETH": { ... } }
     
     all_data = {}
@@ -374,19 +716,51 @@ async def get_all_market_data():
     
     for res in results:
         symbol = res['symbol']
-        # Try to extract current price from the latest 5m midPrice
+        # Current price is the latest 15m midPrice; without one the market is left out,
+        # since a missing price must never reach the account as 0
         try:
-            current_price = res['indicator_data']['15m']['midPrices'][-1]
-            prices[symbol] = current_price
-        except (KeyError, IndexError):
-            prices[symbol] = 0.0
-            
+            current_price = float(res['indicator_data']['15m']['midPrices'][-1])
+        except (KeyError, IndexError, TypeError, ValueError):
+            current_price = 0.0
+        if current_price <= 0:
+            logger.warning(f"Skipping {symbol}: no 15m price in this cycle")
+            continue
+        
+        prices[symbol] = current_price
         all_data[symbol] = res['indicator_data']
         
     return all_data, prices
 
-async def run_agent_cycle():
-    """Main function to run one trading cycle"""
+def build_agent_prompt(market_data: Dict[str, Any], account: PaperTradingAccount,
+                       system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+    """Trading prompt for the given market data and account state (also used by backtest.py)."""
+    # Layout set by PROMPT_ENCODING (json / table / csv), see prompt_encoding.py
+    market_state_str = encode_market_data(market_data)
+    
+    formatted_user_prompt = USER_PROMPT.format(
+        ALL_INDICATOR_DATA=market_state_str,
+        TOTAL_RETURN=f"{account.total_return_pct:.2f}",
+        AVAILABLE_CASH=f"${account.cash:.2f}",
+        ACCOUNT_VALUE=f"${account.total_value:.2f}",
+        OPEN_POSITIONS=account.get_positions_str()
+    )
+    
+    return [
+        {"role": "system", "content": system_prompt or SYSTEM_PROMPT},
+        {"role": "user", "content": formatted_user_prompt}
+    ]
+
+async def _execute_decision(account: PaperTradingAccount, decision: Dict[str, Any],
+                            current_prices: Dict[str, float]) -> bool:
+    """Execute one decision if it targets a tracked coin. Returns True if it was acted on."""
+    target_coin = decision.get("coin") if isinstance(decision, dict) else None
+    if target_coin and target_coin in current_prices:
+        await account.execute_trade(decision, current_prices[target_coin])
+        return True
+    return False
+
+async def run_agent_cycle(on_event: Optional[Callable[[str, Any], None]] = None):
+    """Main function to run one trading cycle (main account only, see accounts.py for several)"""
     
     # Ensure DB is initialized if not already
     if demo_account.collection is None:
@@ -394,88 +768,112 @@ async def run_agent_cycle():
 
     # 1. Gather Data
     market_data, current_prices = await get_all_market_data()
-    
+    # Prefer the last traded price from the live stream over the candle mid price
+    current_prices.update(price_stream.fresh_prices())
+
+    return await run_account_cycle(demo_account, market_data, current_prices, on_event=on_event)
+
+async def run_account_cycle(account: PaperTradingAccount, market_data: Dict[str, Any],
+                            current_prices: Dict[str, float], models: Optional[List[str]] = None,
+                            policy: Optional[str] = None, system_prompt: Optional[str] = None,
+                            on_event: Optional[Callable[[str, Any], None]] = None):
+    """
+    Trading decisions for one account on already gathered market data.
+    With a single model and LLM_STREAM (default on) the response is streamed and each
+    decision is executed as soon as its JSON object is complete. Several models are
+    queried in parallel and combined by the ensemble policy instead.
+    on_event("decision", ...) is called for every executed decision.
+    account.lock is held while the account changes, but not during the LLM call,
+    so price ticks can still close positions meanwhile.
+    """
     # Update positions with new prices
-    await demo_account.update_positions(current_prices)
-    
-    # 2. Format Prompt
-    # Need to make sure json dumping handles standard types
-    market_state_str = json.dumps(market_data, default=str)
-    
-    formatted_user_prompt = USER_PROMPT.format(
-        ALL_INDICATOR_DATA=market_state_str,
-        TOTAL_RETURN=f"{demo_account.total_return_pct:.2f}",
-        AVAILABLE_CASH=f"${demo_account.cash:.2f}",
-        ACCOUNT_VALUE=f"${demo_account.total_value:.2f}",
-        OPEN_POSITIONS=demo_account.get_positions_str()
-    )
-    
-    full_prompt = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "user", "content": formatted_user_prompt}
-    ]
+    async with account.lock:
+        await account.update_positions(current_prices)
+        
+        # 2. Format Prompt
+        full_prompt = build_agent_prompt(market_data, account, system_prompt)
     
-    # 3. Call AI
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if not api_key:
-        logger.error("OPENROUTER_API_KEY not found in env")
+    # 3. Call AI (shared client, started with the app)
+    if not llm_client.start():
         return {"status": "error", "message": "Missing API Key"}
-        
-    client = AsyncOpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=api_key,
-    )
     
-    #model = "nex-agi/deepseek-v3.1-nex-n1:free"
-    #model = "xiaomi/mimo-v2-flash:free" 
-    model = "google/gemini-2.5-flash-lite" 
+    # Models come from AGENT_MODELS (default google/gemini-2.5-flash-lite), see ensemble.py.
+    # A single model is streamed; several are queried in parallel and combined.
+    models = models or get_agent_models()
+    stream = len(models) == 1 and os.getenv("LLM_STREAM", "true").lower() in ("1", "true", "yes")
+    ensemble = None
     
+    results = []
     try:
-        completion = await client.chat.completions.create(
-            model=model,
-            messages=full_prompt,
-            temperature=0.1
-        )
-        
-        response_content = completion.choices[0].message.content
-        logger.info(f"AI Response provided")
-        
-        # 4. Parse Decision
-        # Handles potential markdown code blocks
-        clean_content = response_content.strip()
-        if clean_content.startswith("```json"):
-            clean_content = clean_content[7:]
-        if clean_content.endswith("```"):
-            clean_content = clean_content[:-3]
-        
-        decision_data = json.loads(clean_content)
-        
-        # Ensure it is a list
-        decisions = []
-        if isinstance(decision_data, dict):
-             decisions = [decision_data]
-        elif isinstance(decision_data, list):
-             decisions = decision_data
+        if stream:
+            # 4. Parse decisions incrementally and act on each as it completes. No batch here:
+            # each decision is written as it executes, not when the model finishes
+            parser = JsonArrayStreamParser()
+            deadline = get_agent_deadline()
+            
+            # Same hard deadline as the ensemble path (AGENT_DEADLINE_SECONDS). It only bounds
+            # waiting for the next delta: a decision being executed is never cancelled halfway
+            end = time.monotonic() + deadline
+            stream = llm_client.stream_chat(model=models[0], messages=full_prompt, temperature=0.1)
+            
+            async def next_delta():
+                return await stream.__anext__()
+            
+            timed_out = False
+            try:
+                while True:
+                    remaining = end - time.monotonic()
+                    try:
+                        if remaining <= 0:
+                            raise asyncio.TimeoutError
+                        delta = await asyncio.wait_for(next_delta(), remaining)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        timed_out = True
+                        break
+                    for decision in parser.feed(delta):
+                        async with account.lock:
+                            executed = await _execute_decision(account, decision, current_prices)
+                        if executed:
+                            results.append(decision)
+                            if on_event:
+                                on_event("decision", decision)
+            finally:
+                await stream.aclose()
+            if timed_out:
+                if not parser.count:
+                    raise RuntimeError(f"No model response within the {deadline:g}s deadline")
+                logger.warning(f"AI response cut off at the {deadline:g}s deadline after {parser.count} decisions")
+            logger.info(f"AI Response streamed ({parser.count} decisions)")
+            if not parser.complete:
+                logger.warning("AI response ended before the decision list was closed")
         else:
-             logger.warning("Unknown decision format")
-        
-        results = []
-        for decision in decisions:
-            target_coin = decision.get("coin")
-            if target_coin and target_coin in current_prices:
-                await demo_account.execute_trade(decision, current_prices[target_coin])
-                results.append(decision)
+            # 4. Query the models in parallel and combine their decisions
+            ensemble = await run_ensemble(full_prompt, models=models, policy=policy, temperature=0.1)
+            logger.info(f"AI Response provided ({ensemble['policy']} over {len(models)} models)")
+            if not any(answer["valid"] for answer in ensemble["answers"].values()):
+                errors = {model: answer["error"] for model, answer in ensemble["answers"].items()}
+                raise RuntimeError(f"No valid model response (answers: {errors}, dropped: {ensemble['dropped']})")
+            # All opens/closes of the combined decisions go out in a single account write
+            async with account.lock, account.batch():
+                for decision in ensemble["decisions"]:
+                    if await _execute_decision(account, decision, current_prices):
+                        results.append(decision)
+                        if on_event:
+                            on_event("decision", decision)
         
         return {
             "status": "success", 
             "decisions": results, 
+            "ensemble": ensemble and {k: ensemble[k] for k in ("policy", "answers", "dropped")},
             "account_summary": {
-                "cash": demo_account.cash,
-                "positions": demo_account.positions
+                "cash": account.cash,
+                "positions": account.positions
             }
         }
         
     except Exception as e:
-        logger.exception("Error in trading cycle")
-        return {"status": "error", "message": str(e)}
-
+        logger.exception(f"Error in trading cycle for {account.account_id}")
+        # Decisions already executed from a partial stream still stand
+        return {"status": "error", "message": str(e), "decisions": results}
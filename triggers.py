@@ -0,0 +1,114 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+STOP_LOSS = "STOP_LOSS"
+TAKE_PROFIT = "TAKE_PROFIT"
+
+class _MarketTriggers:
+    """
+    Sorted (level, seq, key) lists for one market, split by what crosses them:
+      falling: long stops and short targets, fire when price <= level
+      rising:  short stops and long targets, fire when price >= level
+    """
+    __slots__ = ("falling", "rising")
+
+    def __init__(self):
+        self.falling: List[Tuple[float, int, Hashable, str]] = []
+        self.rising: List[Tuple[float, int, Hashable, str]] = []
+
+class TriggerIndex:
+    """
+    Stop-loss / take-profit levels of open positions, indexed per market so a price
+    update only touches the triggers it crosses: O(log n + k) instead of a scan over
+    every position. Fired triggers are removed together with the rest of their
+    position's triggers. Keys identify a position and are opaque to the index; the
+    AccountManager shares one index between all accounts, keyed (account_id, coin).
+    """
+    def __init__(self):
+        self.markets: Dict[str, _MarketTriggers] = {}
+        # key -> (market, entries) so a position can be removed without a scan
+        self.entries: Dict[Hashable, Tuple[str, List[Tuple[str, Tuple[float, int, Hashable, str]]]]] = {}
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def add(self, market: str, key: Hashable, side: str, stop_loss: Any = None, take_profit: Any = None):
+        """Index a position's levels, replacing any it already had. side is "LONG" or "SHORT"."""
+        self.remove(key)
+        book = self.markets.setdefault(market, _MarketTriggers())
+        entries = []
+        for level, reason in ((stop_loss, STOP_LOSS), (take_profit, TAKE_PROFIT)):
+            level = _as_level(level)
+            if level is None:
+                continue
+            # Long stops and short targets are hit from above, the others from below
+            direction = "falling" if (side == "LONG") == (reason == STOP_LOSS) else "rising"
+            self._seq += 1
+            entry = (level, self._seq, key, reason)
+            insort(getattr(book, direction), entry)
+            entries.append((direction, entry))
+        if entries:
+            self.entries[key] = (market, entries)
+
+    def remove(self, key: Hashable):
+        indexed = self.entries.pop(key, None)
+        if indexed is None:
+            return
+        market, entries = indexed
+        book = self.markets[market]
+        for direction, entry in entries:
+            levels = getattr(book, direction)
+            i = bisect_left(levels, entry)
+            if i < len(levels) and levels[i] == entry:
+                del levels[i]
+
+    def crossed(self, market: str, price: float) -> List[Tuple[Hashable, str]]:
+        """
+        Remove and return (key, reason) for every position with a level crossed at `price`.
+        A position with both levels crossed reports its stop.
+        """
+        book = self.markets.get(market)
+        if book is None:
+            return []
+        # Levels >= price on the falling side, levels <= price on the rising side
+        i = bisect_left(book.falling, (price,))
+        j = bisect_right(book.rising, (price, float("inf")))
+        hits = book.falling[i:] + book.rising[:j]
+        if not hits:
+            return []
+
+        fired: Dict[Hashable, str] = {}
+        for _, _, key, reason in sorted(hits, key=lambda e: e[1]):
+            if fired.get(key) != STOP_LOSS:
+                fired[key] = reason
+        for key in fired:
+            self.remove(key)
+        return list(fired.items())
+
+def crossed_level(side: str, stop_loss: Any, take_profit: Any, price: float) -> Optional[str]:
+    """The reason (stop first) if `price` crosses one of a single position's levels, else None."""
+    stop, target = _as_level(stop_loss), _as_level(take_profit)
+    if side == "LONG":
+        if stop is not None and price <= stop:
+            return STOP_LOSS
+        if target is not None and price >= target:
+            return TAKE_PROFIT
+    else:
+        if stop is not None and price >= stop:
+            return STOP_LOSS
+        if target is not None and price <= target:
+            return TAKE_PROFIT
+    return None
+
+def _as_level(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        level = float(value)
+    except (TypeError, ValueError):
+        return None
+    return level if level > 0 else None